@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SessionHistory, OutfitAnalysis, Prompt
+from .models import SessionHistory, SessionSummary, OutfitAnalysis, Prompt, AnalysisJob
 
 @admin.register(SessionHistory)
 class SessionHistoryAdmin(admin.ModelAdmin):
@@ -13,6 +13,13 @@ class SessionHistoryAdmin(admin.ModelAdmin):
         qs = super().get_queryset(request)
         return qs.select_related()
 
+@admin.register(SessionSummary)
+class SessionSummaryAdmin(admin.ModelAdmin):
+    list_display = ['session_id', 'user_id', 'turns_summarized', 'updated_at']
+    search_fields = ['session_id', 'user_id', 'summary']
+    readonly_fields = ['session_id', 'summarized_until', 'updated_at']
+    ordering = ['-updated_at']
+
 @admin.register(OutfitAnalysis)
 class OutfitAnalysisAdmin(admin.ModelAdmin):
     list_display = ['title', 'user', 'get_colors_display', 'created_at']
@@ -26,4 +33,12 @@ class OutfitAnalysisAdmin(admin.ModelAdmin):
         return qs.select_related('user')
     
 
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'status', 'created_at', 'updated_at']
+    list_filter = ['status', 'created_at']
+    readonly_fields = ['id', 'session_id', 'created_at', 'updated_at']
+    ordering = ['-created_at']
+    
+
 admin.site.register(Prompt)
@@ -5,6 +5,24 @@ class AiStylistAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ai_stylist_app'
     verbose_name = 'AI Fashion Stylist'
+    
+    def ready(self):
+        from django.conf import settings
+        from django.db.models.signals import post_delete, post_save
+        from fashion_style.storage import release_media_on_delete
+        from .renditions import RENDITION_FIELDS, queue_renditions_on_save
+        from .tokens import load_encoding
+        
+        # SessionHistory is left out so history pruning stays a single DELETE;
+        # files of pruned turns are left to the orphaned media collector
+        for model in ('ai_stylist_app.OutfitAnalysis', 'ai_stylist_app.AnalysisJob', settings.AUTH_USER_MODEL):
+            post_delete.connect(release_media_on_delete, sender=model, dispatch_uid=f'release_media:{model}')
+        
+        for model, _, _ in RENDITION_FIELDS:
+            post_save.connect(queue_renditions_on_save, sender=model, dispatch_uid=f'queue_renditions:{model}')
+        
+        # Read the tokenizer's BPE file once per process instead of on the first AI request
+        load_encoding()
 
 # from django.apps import AppConfig
 
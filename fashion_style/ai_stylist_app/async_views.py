@@ -0,0 +1,195 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, serializers
+from rest_framework.settings import api_settings
+
+from .serializers import OutfitAnalysisRequestSerializer, TextQuerySerializer
+from .session_store import new_session_id
+from .upload_handlers import UploadRejected, guard_uploads
+from .utils import (
+    analyze_and_answer_with_ai_async,
+    analyze_outfit_with_ai_async,
+    build_combined_query,
+    handle_text_query_with_ai_async,
+    record_outfit_analysis,
+    record_chat_turn,
+    update_user_fields,
+)
+
+
+class AsyncAIView(View):
+    """
+    Async counterpart of the AI APIViews for ASGI deployments.
+    Authenticates with the project's DRF authentication classes, answers in JSON
+    and keeps the worker's event loop free while the model is generating.
+    """
+    http_method_names = ['post', 'options']
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token/JWT authenticated like the DRF views, which are CSRF exempt as well
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def dispatch(self, request, *args, **kwargs):
+        return self._dispatch(request, *args, **kwargs)
+
+    async def _dispatch(self, request, *args, **kwargs):
+        try:
+            request.user = await sync_to_async(self.authenticate)(request)
+        except exceptions.APIException as e:
+            detail = e.detail if isinstance(e.detail, (dict, list)) else {"detail": e.detail}
+            return JsonResponse(detail, status=e.status_code, safe=False)
+
+        if request.content_type == 'multipart/form-data':
+            # Parse the upload now, behind the guard handler, so a rejected one never reaches the view
+            guard_uploads(request)
+            try:
+                await sync_to_async(lambda: request.POST)()
+            except UploadRejected as e:
+                return JsonResponse({"error": str(e.detail)}, status=e.status_code)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
+
+    def authenticate(self, request):
+        """Run DEFAULT_AUTHENTICATION_CLASSES in order, falling back to AnonymousUser"""
+        for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            user_auth = authentication_class().authenticate(request)
+            if user_auth is not None:
+                return user_auth[0]
+        return AnonymousUser()
+
+    def get_data(self, request):
+        if request.content_type == 'application/json':
+            try:
+                return json.loads(request.body or b'{}')
+            except ValueError:
+                raise serializers.ValidationError({"detail": "JSON parse error"})
+        return request.POST
+
+    def get_user(self, request):
+        return request.user if request.user.is_authenticated else None
+
+
+class AsyncOutfitAnalysisView(AsyncAIView):
+    """
+    Async outfit analysis
+    POST /api/ai/async/analyze-outfit/
+    """
+    async def post(self, request):
+        try:
+            serializer = OutfitAnalysisRequestSerializer(data=request.FILES)
+            await sync_to_async(serializer.is_valid)(raise_exception=True)
+
+            image_file = serializer.validated_data['image']
+            user = self.get_user(request)
+            user_id = user.id if user else None
+            session_id = await sync_to_async(new_session_id)(user_id)
+
+            analysis_result = await analyze_outfit_with_ai_async(image_file, session_id, user_id)
+
+            _, outfit_data = await sync_to_async(record_outfit_analysis)(user, session_id, image_file, analysis_result)
+            if user:
+                await sync_to_async(update_user_fields)(user, outfit_data=outfit_data)
+
+            return JsonResponse(analysis_result, status=200)
+
+        except serializers.ValidationError as e:
+            return JsonResponse(e.detail, status=400, safe=False)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({"error": "Server error occurred"}, status=500)
+
+
+class AsyncTextQueryView(AsyncAIView):
+    """
+    Async text query
+    POST /api/ai/async/text-query/
+    """
+    async def post(self, request):
+        try:
+            serializer = TextQuerySerializer(data=self.get_data(request))
+            serializer.is_valid(raise_exception=True)
+
+            query = serializer.validated_data['query']
+            user = self.get_user(request)
+            user_id = user.id if user else None
+            session_id = serializer.validated_data.get('session_id') or await sync_to_async(new_session_id)(user_id)
+
+            response_text = await handle_text_query_with_ai_async(query, session_id, user_id)
+
+            await sync_to_async(record_chat_turn)(user, session_id, query, response_text, query=query)
+
+            return JsonResponse({
+                "response": response_text,
+                "session_id": session_id
+            }, status=200)
+
+        except serializers.ValidationError as e:
+            return JsonResponse(e.detail, status=400, safe=False)
+        except Exception as e:
+            return JsonResponse({"error": "Server error occurred"}, status=500)
+
+
+class AsyncChatView(AsyncAIView):
+    """
+    Async combined chatbot endpoint (text, text+image, image only)
+    POST /api/ai/async/chat/
+    """
+    async def post(self, request):
+        try:
+            data = self.get_data(request)
+            query = (data.get('query') or '').strip()
+            image_file = request.FILES.get('image')
+            user = self.get_user(request)
+            user_id = user.id if user else None
+            session_id = data.get('session_id') or await sync_to_async(new_session_id)(user_id)
+
+            if not query and not image_file:
+                return JsonResponse({"error": "Must provide query or image"}, status=400)
+
+            # Case 1: Text only
+            if query and not image_file:
+                response_text = await handle_text_query_with_ai_async(query, session_id, user_id)
+                await sync_to_async(record_chat_turn)(user, session_id, query, response_text, query=query)
+
+            # Case 2: Text + Image
+            elif query and image_file:
+                if settings.AI_COMBINED_IMAGE_QUERY:
+                    analysis, response_text = await analyze_and_answer_with_ai_async(image_file, query, session_id, user_id)
+                else:
+                    analysis = await analyze_outfit_with_ai_async(image_file, session_id, user_id)
+                    response_text = await handle_text_query_with_ai_async(build_combined_query(query, analysis),
+                                                                          session_id, user_id)
+                user_input = f"Image upload with query: {query}"
+                await sync_to_async(record_chat_turn)(user, session_id, user_input, response_text, query=query,
+                                                      image_file=image_file, analysis=analysis)
+
+            # Case 3: Image only
+            else:
+                analysis = await analyze_outfit_with_ai_async(image_file, session_id, user_id)
+                response_text = analysis['advice']
+                await sync_to_async(record_chat_turn)(user, session_id, "Image upload", response_text,
+                                                      image_file=image_file, analysis=analysis)
+
+            return JsonResponse({
+                "response": response_text,
+                "session_id": session_id
+            }, status=200)
+
+        except serializers.ValidationError as e:
+            return JsonResponse(e.detail, status=400, safe=False)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({"error": "Server error occurred"}, status=500)
@@ -0,0 +1,76 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import caches
+from . import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_CACHE_ALIAS = 'ai_analysis'
+
+
+def _analysis_cache():
+    return caches[ANALYSIS_CACHE_ALIAS]
+
+
+def analysis_cache_key(image_data, prompt_version):
+    """Key a cached analysis by the normalized image content and the prompt it was produced with"""
+    if isinstance(image_data, str):
+        image_data = image_data.encode('utf-8')
+    digest = hashlib.sha256(image_data).hexdigest()
+    return f"analysis:{prompt_version}:{digest}"
+
+
+def get_cached_analysis(key):
+    """Return a cached analysis dict or None, updating hit/miss counters"""
+    if not getattr(settings, 'AI_ANALYSIS_CACHE_ENABLED', True):
+        return None
+    try:
+        entry = _analysis_cache().get(key)
+    except Exception as e:
+        logger.warning(f"Error reading analysis cache: {e}")
+        entry = None
+
+    if entry is None:
+        metrics.incr('analysis_cache.misses')
+        return None
+
+    metrics.incr('analysis_cache.hits')
+    # Credit the upstream latency and tokens this hit avoided
+    metrics.incr('analysis_cache.saved_ms', entry.get('latency_ms', 0))
+    metrics.incr('analysis_cache.saved_tokens', entry.get('total_tokens', 0))
+    return entry['result']
+
+
+def cache_analysis(key, result, latency_ms=0, total_tokens=0):
+    """Store an analysis result along with what it cost to produce"""
+    if not getattr(settings, 'AI_ANALYSIS_CACHE_ENABLED', True):
+        return
+    try:
+        _analysis_cache().set(key, {
+            'result': result,
+            'latency_ms': int(latency_ms),
+            'total_tokens': int(total_tokens or 0),
+        })
+    except Exception as e:
+        logger.warning(f"Error writing analysis cache: {e}")
+
+
+def get_analysis_cache_stats():
+    """Hit/miss counters and the upstream spend they saved"""
+    counters = metrics.get_counters([
+        'analysis_cache.hits',
+        'analysis_cache.misses',
+        'analysis_cache.saved_ms',
+        'analysis_cache.saved_tokens',
+    ])
+    hits = counters['analysis_cache.hits']
+    misses = counters['analysis_cache.misses']
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+        'saved_seconds': round(counters['analysis_cache.saved_ms'] / 1000, 2),
+        'saved_tokens': counters['analysis_cache.saved_tokens'],
+    }
@@ -0,0 +1,115 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test import override_settings
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+)
+
+from ai_stylist_app.models import SessionHistory
+from ai_stylist_app.utils import save_session_history
+
+SEED_BATCH_SIZE = 10000
+TRANSACTION_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+
+def legacy_save_session_history(session_id, user_input, response, user_id=None, image=None, analysis_data=None):
+    """save_session_history as it was before set-based pruning: count, then delete row by row"""
+    SessionHistory.objects.create(
+        session_id=session_id,
+        user_id=str(user_id) if user_id else None,
+        user_input=user_input,
+        response=response,
+        image=image,
+        analysis_data=analysis_data
+    )
+
+    history = SessionHistory.objects.filter(session_id=session_id).order_by('-timestamp')
+    if user_id:
+        history = history.filter(user_id=str(user_id))
+
+    if history.count() > 10:
+        old_entries = history[10:]
+        for entry in old_entries:
+            entry.delete()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-turn queries and write latency of the legacy and set-based session history pruning "
+        "on a throwaway test database seeded with many rows"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="SessionHistory rows to seed")
+        parser.add_argument('--turns-per-session', type=int, default=10, help="Seeded turns per session")
+        parser.add_argument('--turns', type=int, default=300, help="Chat turns to time per strategy")
+
+    def handle(self, *args, **options):
+        # Run against a throwaway test database so the benchmark never touches real data
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            sessions = self._seed(options['rows'], options['turns_per_session'])
+            # Summaries are out of scope here; only the insert + prune path is measured
+            with override_settings(AI_SESSION_SUMMARIES_ENABLED=False):
+                results = [
+                    self._run("legacy (count + per-row delete)", legacy_save_session_history, sessions, options['turns']),
+                    self._run("set-based (single delete)", save_session_history, sessions, options['turns']),
+                ]
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(
+            f"{options['rows']:,} seeded rows over {sessions:,} sessions on {connection.vendor}, "
+            f"{options['turns']} turns per strategy"
+        )
+        for label, queries, latencies in results:
+            self.stdout.write(
+                f"{label:<34} {statistics.mean(queries):5.1f} queries/turn  "
+                f"p50 {statistics.median(latencies):7.2f} ms  "
+                f"p95 {statistics.quantiles(latencies, n=20)[-1]:7.2f} ms"
+            )
+
+    def _seed(self, rows, turns_per_session):
+        sessions = max(1, rows // turns_per_session)
+        self.stdout.write(f"Seeding {rows:,} session history rows...")
+
+        def generate():
+            for i in range(rows):
+                session = i % sessions
+                yield SessionHistory(
+                    session_id=f"bench-{session}",
+                    user_id=str(session % 1000 + 1),
+                    user_input=f"What goes with this? #{i}",
+                    response="Try white sneakers and a denim jacket ✨",
+                )
+
+        batch = []
+        for entry in generate():
+            batch.append(entry)
+            if len(batch) == SEED_BATCH_SIZE:
+                SessionHistory.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            SessionHistory.objects.bulk_create(batch)
+        return sessions
+
+    def _run(self, label, save, sessions, turns):
+        queries, latencies = [], []
+        for _ in range(turns):
+            session = random.randrange(sessions)
+            # The query log is a bounded deque; start each turn from an empty one so counts stay exact
+            reset_queries()
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                save(f"bench-{session}", "And with a blazer?", "A navy blazer works great 👔", user_id=session % 1000 + 1)
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(sum(
+                1 for query in ctx.captured_queries if not query['sql'].upper().startswith(TRANSACTION_STATEMENTS)
+            ))
+        return label, queries, latencies
@@ -0,0 +1,118 @@
+import base64
+import math
+import os
+import statistics
+import time
+import tracemalloc
+from io import BytesIO
+from PIL import Image
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_stylist_app.utils import preprocess_image
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def legacy_encode_image(image_file):
+    """encode_image as it was before preprocess_image: verify, reopen, full-size re-encode"""
+    img = Image.open(image_file)
+    img.verify()
+    img = Image.open(image_file)
+    img_format = img.format.lower()
+    buffer = BytesIO()
+    if img_format == 'png':
+        img.convert('RGB').save(buffer, format="JPEG", quality=85)
+    else:
+        img.save(buffer, format=img_format, quality=85)
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+def current_encode_image(image_file):
+    return base64.b64encode(preprocess_image(image_file)).decode('utf-8')
+
+
+def estimate_image_tokens(width, height):
+    """OpenAI high-detail estimate: fit 2048 box, shortest side to 768, 170 tokens per 512px tile + 85"""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+class Command(BaseCommand):
+    help = "Compare the legacy and current encode_image pipelines on a corpus of sample photos"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help="Image files or directories (defaults to the outfit_images/ and ai_images/ media folders)"
+        )
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per image and pipeline")
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or [
+            os.path.join(settings.MEDIA_ROOT, 'outfit_images'),
+            os.path.join(settings.MEDIA_ROOT, 'ai_images'),
+        ]
+        corpus = self._collect(paths)
+        if not corpus:
+            raise CommandError("No JPEG/PNG images found in the given paths")
+
+        pipelines = [('legacy', legacy_encode_image), ('current', current_encode_image)]
+        totals = {name: {'ms': [], 'peak_kb': [], 'payload_kb': [], 'tokens': []} for name, _ in pipelines}
+
+        for path in corpus:
+            with open(path, 'rb') as fh:
+                raw = fh.read()
+            self.stdout.write(f"{os.path.basename(path)} ({len(raw) / 1024:.0f} KB)")
+            for name, encode in pipelines:
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    encode(BytesIO(raw))
+                    timings.append((time.perf_counter() - started) * 1000)
+
+                tracemalloc.start()
+                payload = encode(BytesIO(raw))
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                with Image.open(BytesIO(base64.b64decode(payload))) as sent:
+                    sent_size = sent.size
+                tokens = estimate_image_tokens(*sent_size)
+
+                row = totals[name]
+                row['ms'].append(statistics.median(timings))
+                row['peak_kb'].append(peak / 1024)
+                row['payload_kb'].append(len(payload) / 1024)
+                row['tokens'].append(tokens)
+                self.stdout.write(
+                    f"  {name:<8} {row['ms'][-1]:8.1f} ms  peak {row['peak_kb'][-1]:8.0f} KB  "
+                    f"payload {row['payload_kb'][-1]:8.0f} KB  {sent_size[0]}x{sent_size[1]}  ~{tokens} tokens"
+                )
+
+        self.stdout.write("")
+        self.stdout.write(f"Corpus: {len(corpus)} images, max edge {settings.AI_IMAGE_MAX_EDGE}px")
+        for name, _ in pipelines:
+            row = totals[name]
+            self.stdout.write(
+                f"{name:<8} mean {statistics.mean(row['ms']):8.1f} ms  peak {statistics.mean(row['peak_kb']):8.0f} KB  "
+                f"payload {sum(row['payload_kb']):8.0f} KB total  ~{sum(row['tokens'])} image tokens total"
+            )
+        self.stdout.write(
+            "Peak memory is Python-side (tracemalloc); Pillow's decoded frame buffers are allocated in C "
+            "and shrink further with draft decoding."
+        )
+
+    def _collect(self, paths):
+        corpus = []
+        for path in paths:
+            if os.path.isdir(path):
+                for name in sorted(os.listdir(path)):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        corpus.append(os.path.join(path, name))
+            elif os.path.isfile(path):
+                corpus.append(path)
+        return corpus
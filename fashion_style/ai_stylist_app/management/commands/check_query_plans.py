@@ -0,0 +1,140 @@
+import re
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.utils import timezone
+
+from ai_stylist_app.models import OutfitAnalysis, SessionHistory
+from fashion_style.media_views import owner_filter
+
+HOT_TABLES = [SessionHistory._meta.db_table, OutfitAnalysis._meta.db_table]
+
+
+def full_scans(plan, vendor):
+    """Hot tables the plan reads without an index"""
+    scanned = []
+    for table in HOT_TABLES:
+        if vendor == 'sqlite':
+            # SEARCH uses an index for the filter; SCAN walks the whole table (or a whole index)
+            pattern = rf'\bSCAN {table}\b'
+        elif vendor == 'postgresql':
+            pattern = rf'\bSeq Scan on {table}\b'
+        elif vendor == 'mysql':
+            pattern = rf'\btable:\s*{table}\b.*\btype:\s*ALL\b'
+        else:
+            continue
+        if re.search(pattern, plan):
+            scanned.append(table)
+    return scanned
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the hot SessionHistory/OutfitAnalysis queries on a seeded test database "
+        "and fail if any of them reads a table without an index"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=2000, help="Sessions to seed before planning")
+        parser.add_argument('--verbose-plans', action='store_true', help="Print the full plan of every query")
+
+    def handle(self, *args, **options):
+        # Plan against a throwaway test database so the check never touches real data
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            user = self._seed(options['sessions'])
+            failures = self._check(user, options['verbose_plans'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if failures:
+            raise CommandError(f"Full table scans in: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All hot queries use an index"))
+
+    def _seed(self, sessions):
+        User = get_user_model()
+        users = [
+            User(email=f"plan{i}@example.com", phone_number=f"+1555{i:07d}", is_verified=True)
+            for i in range(50)
+        ]
+        User.objects.bulk_create(users)
+        users = list(User.objects.order_by('id'))
+
+        now = timezone.now()
+        SessionHistory.objects.bulk_create([
+            SessionHistory(
+                session_id=f"plan-{i // 10}",
+                user_id=str(users[(i // 10) % len(users)].id),
+                user_input="What goes with this?",
+                response="Try white sneakers ✨",
+            )
+            for i in range(sessions * 10)
+        ], batch_size=1000)
+        OutfitAnalysis.objects.bulk_create([
+            OutfitAnalysis(
+                user=users[i % len(users)],
+                session_id=f"plan-{i}",
+                image='outfit_images/plan.jpg',
+                title="Plan",
+                colors=[],
+                description="",
+                advice="",
+                bullet_advice=[],
+            )
+            for i in range(sessions)
+        ], batch_size=1000)
+        SessionHistory.objects.filter(pk__in=SessionHistory.objects.values('pk')[:sessions]).update(
+            timestamp=now - timedelta(days=1)
+        )
+
+        # Give the planner real statistics
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        return users[0]
+
+    def hot_queries(self, user):
+        """(label, queryset) for every hot read path, built the way the app builds them"""
+        session_id = "plan-7"
+        user_id = str(user.id)
+        limit = 10
+        media_name = "content/ab/" + "ab" * 32 + ".jpg"
+
+        session_history = SessionHistory.objects.filter(session_id=session_id)
+        user_session_history = session_history.filter(user_id=user_id)
+        latest = user_session_history.order_by('-timestamp', '-id').values('pk')[:limit]
+
+        return [
+            ("get_session_history", user_session_history.order_by('-timestamp').only('user_input', 'response')[:limit]),
+            ("get_session_history (anonymous)", session_history.order_by('-timestamp').only('user_input', 'response')[:limit]),
+            ("schedule_session_summary", user_session_history.filter(timestamp__gt=timezone.now() - timedelta(hours=1))),
+            ("save_session_history prune (latest)", latest),
+            ("save_session_history prune (delete set)", user_session_history.exclude(pk__in=latest).values('pk')),
+            ("summarize_session_task", user_session_history.order_by('timestamp')),
+            ("UserConversationHistoryView", SessionHistory.objects.filter(user_id=user_id).order_by('-timestamp', '-id')[:21]),
+            ("UserConversationHistoryView (session)", user_session_history.order_by('-timestamp', '-id')[:21]),
+            ("User.get_conversation_history", user.get_conversation_history()),
+            ("User.get_outfit_analyses", user.get_outfit_analyses()),
+            ("OutfitAnalysisHistoryView", OutfitAnalysis.objects.filter(user=user)[:20]),
+            ("OutfitAnalysisHistoryView (cursor)", OutfitAnalysis.objects.filter(user=user).order_by('-created_at', '-id')[:11]),
+            ("ProtectedMediaView (history)", SessionHistory.objects.filter(image=media_name).filter(owner_filter('ai_stylist_app.SessionHistory', user))),
+            ("ProtectedMediaView (outfit)", OutfitAnalysis.objects.filter(image=media_name).filter(owner_filter('ai_stylist_app.OutfitAnalysis', user))),
+        ]
+
+    def _check(self, user, verbose):
+        failures = []
+        for label, queryset in self.hot_queries(user):
+            plan = queryset.explain()
+            scanned = full_scans(plan, connection.vendor)
+            if scanned:
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f"FULL SCAN  {label}: {', '.join(scanned)}"))
+            else:
+                self.stdout.write(f"index      {label}")
+            if verbose or scanned:
+                self.stdout.write("    " + plan.replace("\n", "\n    "))
+        return failures
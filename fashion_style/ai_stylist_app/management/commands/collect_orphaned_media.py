@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fashion_style.media_gc import collect_orphaned_media
+
+
+class Command(BaseCommand):
+    help = "Delete media files no SessionHistory, OutfitAnalysis, AnalysisJob or User row references, resuming from the last checkpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report orphans and their size without deleting them")
+        parser.add_argument('--limit', type=int, default=None, help="Files checked in this run (default MEDIA_GC_FILES_PER_RUN)")
+        parser.add_argument('--batch-size', type=int, default=None, help="Files checked per reference query (default MEDIA_GC_BATCH_SIZE)")
+        parser.add_argument('--pause', type=float, default=None, help="Seconds to sleep between batches (default MEDIA_GC_BATCH_PAUSE)")
+        parser.add_argument('--grace', type=int, default=None, help="Keep files modified within this many seconds (default MEDIA_GC_GRACE_SECONDS)")
+        parser.add_argument('--restart', action='store_true', help="Scan from the beginning instead of the stored checkpoint")
+
+    def handle(self, *args, **options):
+        report = collect_orphaned_media(
+            limit=options['limit'],
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            grace=options['grace'],
+            dry_run=options['dry_run'],
+            restart=options['restart'],
+        )
+        if report is None:
+            raise CommandError("Another orphaned media collection is running")
+
+        verb = "Would delete" if report['dry_run'] else "Deleted"
+        self.stdout.write(f"Scanned {report['scanned']} files from {report['start'] or 'the beginning'}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['orphaned']} orphaned files, reclaiming {report['bytes_reclaimed']} bytes ({report['bytes_reclaimed'] / (1024 * 1024):.1f} MB)"
+        ))
+        if report['complete']:
+            self.stdout.write("Reached the end of the media directory; the next run starts over")
+        else:
+            self.stdout.write(f"Next run resumes after {report['checkpoint']}")
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_stylist_app.tokens import cached_bpe_path, load_encoding, tiktoken
+
+
+class Command(BaseCommand):
+    help = "Download tiktoken's BPE file into AI_TOKENIZER_CACHE_DIR; run at build time so the server never fetches it"
+
+    def handle(self, *args, **options):
+        if tiktoken is None:
+            raise CommandError("tiktoken is not installed")
+        if not settings.AI_TOKENIZER_CACHE_DIR:
+            raise CommandError("AI_TOKENIZER_CACHE_DIR (TIKTOKEN_CACHE_DIR) is not set")
+        if load_encoding(download=True) is None:
+            raise CommandError("Could not load the tokenizer; see the log for the reason")
+        self.stdout.write(self.style.SUCCESS(f"Tokenizer cached at {cached_bpe_path(settings.AI_TOKENIZER_CACHE_DIR)}"))
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from openai import AsyncOpenAI, OpenAI
+
+from ai_stylist_app import utils
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    """OpenAI-compatible chat completions stub that answers after a fixed delay"""
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        super().__init__(('127.0.0.1', 0), StubLLMHandler)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def reset(self):
+        with self.lock:
+            self.in_flight = 0
+            self.peak_in_flight = 0
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server.lock:
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+        try:
+            time.sleep(server.latency)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+        body = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4o",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "Stub styling tip ✨"},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 50, "completion_tokens": 10, "total_tokens": 60}
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the sync and async text-query endpoints against a local stub LLM server "
+        "and report how many LLM calls a single worker keeps in flight"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help="Concurrent requests per scenario")
+        parser.add_argument('--llm-latency', type=float, default=0.5, help="Stub LLM response time in seconds")
+        parser.add_argument('--threads', type=int, default=1,
+                            help="Threads of the simulated sync worker (1 = gunicorn sync worker)")
+
+    def handle(self, *args, **options):
+        server = StubLLMServer(options['llm_latency'])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        original_clients = utils.client, utils.async_client
+        utils.client = OpenAI(api_key='stub', base_url=server.base_url, max_retries=0)
+        utils.async_client = AsyncOpenAI(api_key='stub', base_url=server.base_url, max_retries=0)
+
+        # Run against a throwaway test database so the load test never touches real data
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            results = [
+                self._run_sync(server, options['requests'], options['threads']),
+                self._run_async(server, options['requests']),
+            ]
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            utils.client, utils.async_client = original_clients
+            server.shutdown()
+
+        self.stdout.write(
+            f"{options['requests']} concurrent text queries, stub LLM latency {options['llm_latency']}s"
+        )
+        for label, elapsed, peak, errors in results:
+            self.stdout.write(
+                f"{label:<40} {elapsed:7.2f} s  {options['requests'] / elapsed:7.1f} req/s  "
+                f"peak in-flight LLM calls {peak:4d}  errors {errors}"
+            )
+
+    def _run_sync(self, server, total, threads):
+        server.reset()
+        local = threading.local()
+
+        def send(i):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            response = local.client.post('/api/ai/text-query/', {'query': f"What goes with jeans? #{i}"})
+            return response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            statuses = list(pool.map(send, range(total)))
+        elapsed = time.perf_counter() - started
+        errors = sum(1 for code in statuses if code != 200)
+        return f"sync TextQueryView ({threads} worker thread{'s' if threads > 1 else ''})", elapsed, server.peak_in_flight, errors
+
+    def _run_async(self, server, total):
+        server.reset()
+
+        async def run_all():
+            client = AsyncClient()
+            responses = await asyncio.gather(*[
+                client.post('/api/ai/async/text-query/', {'query': f"What goes with jeans? #{i}"})
+                for i in range(total)
+            ])
+            return [response.status_code for response in responses]
+
+        started = time.perf_counter()
+        statuses = asyncio.run(run_all())
+        elapsed = time.perf_counter() - started
+        errors = sum(1 for code in statuses if code != 200)
+        return "async AsyncTextQueryView (1 event loop)", elapsed, server.peak_in_flight, errors
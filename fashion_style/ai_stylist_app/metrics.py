@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.cache import caches
+import logging
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = 'ai_metrics:'
+
+
+def _metrics_cache():
+    return caches[getattr(settings, 'AI_METRICS_CACHE_ALIAS', 'default')]
+
+
+def incr(name, amount=1):
+    """Increment a named counter (created on first use, never expires)"""
+    cache = _metrics_cache()
+    key = METRICS_PREFIX + name
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # Counter does not exist yet; add() keeps concurrent creators from clobbering each other
+        if not cache.add(key, amount, timeout=None):
+            cache.incr(key, amount)
+    except Exception as e:
+        logger.warning(f"Error updating metric {name}: {e}")
+
+
+def get_counters(names):
+    """Return {name: value} for the given counters, missing ones as 0"""
+    try:
+        values = _metrics_cache().get_many([METRICS_PREFIX + name for name in names])
+    except Exception:
+        values = {}
+    return {name: values.get(METRICS_PREFIX + name, 0) for name in names}
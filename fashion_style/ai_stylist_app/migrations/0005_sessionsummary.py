@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_stylist_app', '0004_analysisjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=100)),
+                ('user_id', models.CharField(blank=True, default='', max_length=100)),
+                ('summary', models.TextField(blank=True)),
+                ('summarized_until', models.DateTimeField(blank=True, null=True)),
+                ('turns_summarized', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('session_id', 'user_id')},
+            },
+        ),
+    ]
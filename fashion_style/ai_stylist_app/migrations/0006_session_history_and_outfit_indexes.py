@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_stylist_app', '0005_sessionsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='outfitanalysis',
+            index=models.Index(fields=['user', '-created_at'], name='outfitanalysis_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='sessionhistory',
+            index=models.Index(fields=['session_id', 'user_id', '-timestamp'], name='sessionhist_session_user_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='sessionhistory',
+            index=models.Index(fields=['user_id', '-timestamp'], name='sessionhist_user_ts'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_stylist_app', '0006_session_history_and_outfit_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outfitanalysis',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='sessionhistory',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
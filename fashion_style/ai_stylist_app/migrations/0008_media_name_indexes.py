@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_stylist_app', '0007_image_renditions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='analysisjob',
+            index=models.Index(fields=['image'], name='analysisjob_image'),
+        ),
+        migrations.AddIndex(
+            model_name='outfitanalysis',
+            index=models.Index(fields=['image'], name='outfitanalysis_image'),
+        ),
+        migrations.AddIndex(
+            model_name='sessionhistory',
+            index=models.Index(fields=['image'], name='sessionhist_image'),
+        ),
+    ]
@@ -11,10 +11,19 @@ class SessionHistory(models.Model):
     response = models.TextField()
     image = models.ImageField(upload_to='ai_images/', blank=True, null=True)
     analysis_data = models.JSONField(blank=True, null=True)  # Store outfit analysis JSON
+    renditions = models.JSONField(default=dict, blank=True)  # Thumbnail names, see ai_stylist_app.renditions
     timestamp = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Context building and pruning: one session (optionally one user), newest first
+            models.Index(fields=['session_id', 'user_id', '-timestamp'], name='sessionhist_session_user_ts'),
+            # Per-user conversation history
+            models.Index(fields=['user_id', '-timestamp'], name='sessionhist_user_ts'),
+            # Media ownership checks and reference counting look rows up by file name
+            models.Index(fields=['image'], name='sessionhist_image'),
+        ]
     
     def __str__(self):
         return f"Session {self.session_id} - {self.timestamp}"
@@ -25,10 +34,26 @@ class SessionHistory(models.Model):
             return self.analysis_data
         return {}
 
+class SessionSummary(models.Model):
+    """Running summary of the turns of a session that are no longer sent verbatim"""
+    session_id = models.CharField(max_length=100)
+    user_id = models.CharField(max_length=100, blank=True, default='')  # Empty for anonymous sessions
+    summary = models.TextField(blank=True)
+    summarized_until = models.DateTimeField(blank=True, null=True)  # Timestamp of the last turn folded into the summary
+    turns_summarized = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['session_id', 'user_id']
+    
+    def __str__(self):
+        return f"Summary {self.session_id} ({self.turns_summarized} turns)"
+
 class OutfitAnalysis(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, blank=True, null=True)
     session_id = models.CharField(max_length=100, default=uuid4)
     image = models.ImageField(upload_to='outfit_images/')
+    renditions = models.JSONField(default=dict, blank=True)  # Thumbnail names, see ai_stylist_app.renditions
     title = models.CharField(max_length=100)
     colors = models.JSONField()  # Store colors as JSON array
     description = models.TextField()
@@ -38,6 +63,10 @@ class OutfitAnalysis(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='outfitanalysis_user_created'),
+            models.Index(fields=['image'], name='outfitanalysis_image'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.created_at}"
@@ -53,6 +82,39 @@ class OutfitAnalysis(models.Model):
         if isinstance(self.bullet_advice, list):
             return self.bullet_advice
         return []
+class AnalysisJob(models.Model):
+    """Outfit analysis queued to Celery; clients poll it for the result"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, blank=True, null=True)
+    session_id = models.CharField(max_length=100, default=uuid4)
+    image = models.ImageField(upload_to='outfit_images/')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    result = models.JSONField(blank=True, null=True)  # Analysis JSON once succeeded
+    error = models.TextField(blank=True)
+    outfit_analysis = models.ForeignKey(OutfitAnalysis, on_delete=models.SET_NULL, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['image'], name='analysisjob_image'),
+        ]
+    
+    def __str__(self):
+        return f"Analysis job {self.id} - {self.status}"
+
 # from django.db import models
 
 # class SessionHistory(models.Model):
@@ -8,4 +8,15 @@ class AdminOrReadOnly(BasePermission):
     def has_permission(self, request, view):
         if request.method in SAFE_METHODS:
             return True
-        return request.user and request.user.is_staff
\ No newline at end of file
+        return request.user and request.user.is_staff
+
+class IsAdminRole(BasePermission):
+    """
+    Allow access only to Stap_admin and superadmin users.
+    """
+    def has_permission(self, request, view):
+        return bool(
+            request.user
+            and request.user.is_authenticated
+            and request.user.role in ['Stap_admin', 'superadmin']
+        )
@@ -0,0 +1,155 @@
+import hashlib
+import os
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+from fashion_style.storage import RENDITIONS_DIR, is_content_name
+import logging
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# (model, image field, renditions field) of every image that gets renditions
+RENDITION_FIELDS = [
+    ('ai_stylist_app.OutfitAnalysis', 'image', 'renditions'),
+    ('ai_stylist_app.SessionHistory', 'image', 'renditions'),
+    ('fashion_app.User', 'profile_image', 'profile_image_renditions'),
+]
+
+
+def rendition_sizes():
+    """{size name: longest edge in px}"""
+    return getattr(settings, 'MEDIA_RENDITION_SIZES', {'small': 200, 'medium': 480, 'large': 960})
+
+
+def rendition_name(source_name, size, fmt):
+    """Storage name of one rendition; shared by every row whose image has the same content"""
+    if is_content_name(source_name):
+        key = os.path.splitext(os.path.basename(source_name))[0]
+    else:
+        key = hashlib.sha256(source_name.encode('utf-8')).hexdigest()
+    return f"{RENDITIONS_DIR}/{key[:2]}/{key}_{size}.{fmt}"
+
+
+def generate_renditions(source_name, storage=None):
+    """
+    Write the WebP/JPEG renditions of a stored image at every MEDIA_RENDITION_SIZES size,
+    decoding the source only if some are missing. Returns {'source', size: {fmt: name}}.
+    """
+    storage = storage or default_storage
+    sizes = rendition_sizes()
+    renditions = {'source': source_name}
+    missing = []
+    for size, edge in sizes.items():
+        renditions[size] = {fmt: rendition_name(source_name, size, fmt) for fmt in RENDITION_FORMATS}
+        missing += [(edge, fmt, name) for fmt, name in renditions[size].items() if not storage.exists(name)]
+    if not missing:
+        return renditions
+
+    with storage.open(source_name, 'rb') as source:
+        img = Image.open(source)
+        img.draft('RGB', (max(sizes.values()),) * 2)  # JPEG sources decode at a reduced scale
+        img.load()
+    ImageOps.exif_transpose(img, in_place=True)
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        rgba = img.convert('RGBA')
+        img = Image.new('RGB', rgba.size, (255, 255, 255))
+        img.paste(rgba, mask=rgba.getchannel('A'))
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    # Largest first, so each smaller size is reduced from the previous one rather than the original
+    for edge in sorted({edge for edge, _, _ in missing}, reverse=True):
+        img.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        for _, fmt, name in (item for item in missing if item[0] == edge):
+            pil_format, options = RENDITION_FORMATS[fmt]
+            buffer = BytesIO()
+            img.save(buffer, format=pil_format, **options)
+            storage.save(name, ContentFile(buffer.getvalue()))
+    return renditions
+
+
+def delete_renditions(source_name, storage=None):
+    """Remove every rendition file of a source image"""
+    storage = storage or default_storage
+    for size in rendition_sizes():
+        for fmt in RENDITION_FORMATS:
+            storage.delete(rendition_name(source_name, size, fmt))
+
+
+def renditions_queue_key(source_name):
+    return f"renditions_queued:{hashlib.sha256(source_name.encode('utf-8')).hexdigest()}"
+
+
+def enqueue_renditions(model_label, pk, source_name):
+    """
+    Queue rendition generation for a row once the current transaction commits. Rows sharing a
+    content-addressed file share one task, which records the renditions on all of them.
+    """
+    def enqueue():
+        from fashion_style.celery import publish
+        from .tasks import generate_renditions_task
+        key = renditions_queue_key(source_name)
+        if not cache.add(key, 1, timeout=getattr(settings, 'MEDIA_RENDITIONS_QUEUE_TIMEOUT', 600)):
+            return  # already queued; the task covers this row too
+        try:
+            publish(generate_renditions_task, model_label, pk)
+        except Exception as e:
+            # No broker: serializers keep serving the original image. The key stays set for a
+            # while so other rows of this file don't each wait on the broker again.
+            cache.set(key, 1, timeout=getattr(settings, 'MEDIA_RENDITIONS_RETRY_BACKOFF', 60))
+            logger.warning(f"Could not queue renditions for {model_label} {pk}: {e}")
+
+    transaction.on_commit(enqueue)
+
+
+def record_renditions(source_name, renditions):
+    """Store the renditions of a file on every row whose image it is"""
+    from django.apps import apps
+    for model_label, image_field, renditions_field in RENDITION_FIELDS:
+        # update() skips save signals and auto_now
+        apps.get_model(model_label)._default_manager.filter(**{image_field: source_name}).update(
+            **{renditions_field: renditions}
+        )
+
+
+def queue_renditions_on_save(sender, instance, **kwargs):
+    """post_save receiver: queue renditions for a row whose image has none yet"""
+    for model_label, image_field, renditions_field in RENDITION_FIELDS:
+        if sender._meta.label != model_label:
+            continue
+        if {image_field, renditions_field} & instance.get_deferred_fields():
+            continue  # loaded with only()/defer(); don't query just to check
+        image = getattr(instance, image_field)
+        if image and image.name and (getattr(instance, renditions_field) or {}).get('source') != image.name:
+            enqueue_renditions(model_label, instance.pk, image.name)
+
+
+def rendition_urls(image, renditions, request=None):
+    """
+    {size: {fmt: url}} for a serializer; every URL falls back to the original image
+    while its renditions are still being generated
+    """
+    if not image or not image.name:
+        return None
+
+    def absolute(url):
+        return request.build_absolute_uri(url) if request is not None else url
+
+    ready = (renditions or {}).get('source') == image.name
+    original = absolute(image.url)
+    urls = {}
+    for size in rendition_sizes():
+        urls[size] = {
+            fmt: absolute(image.storage.url(renditions[size][fmt])) if ready and fmt in renditions.get(size, {}) else original
+            for fmt in RENDITION_FORMATS
+        }
+    return urls
@@ -1,15 +1,18 @@
 from rest_framework import serializers
-from .models import SessionHistory, OutfitAnalysis, Prompt
+from .models import SessionHistory, OutfitAnalysis, Prompt, AnalysisJob
+from .renditions import rendition_urls
+from .upload_handlers import SNIFF_BYTES, max_image_size, size_limit_message, sniff_image_type
 
 class OutfitAnalysisSerializer(serializers.ModelSerializer):
     colors_display = serializers.SerializerMethodField()
     bullet_advice_display = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
     
     class Meta:
         model = OutfitAnalysis
         fields = ['id', 'title', 'colors', 'colors_display', 'description', 
                  'advice', 'bullet_advice', 'bullet_advice_display', 'image', 
-                 'created_at', 'session_id']
+                 'image_renditions', 'created_at', 'session_id']
         read_only_fields = ['id', 'created_at', 'session_id']
     
     def get_colors_display(self, obj):
@@ -17,18 +20,38 @@ class OutfitAnalysisSerializer(serializers.ModelSerializer):
     
     def get_bullet_advice_display(self, obj):
         return obj.get_bullet_advice_display()
+    
+    def get_image_renditions(self, obj):
+        return rendition_urls(obj.image, obj.renditions, self.context.get('request'))
 
 class SessionHistorySerializer(serializers.ModelSerializer):
     analysis_data_display = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
     
     class Meta:
         model = SessionHistory
-        fields = ['id', 'session_id', 'user_input', 'response', 'image', 
+        fields = ['id', 'session_id', 'user_input', 'response', 'image', 'image_renditions', 
                  'analysis_data', 'analysis_data_display', 'timestamp']
         read_only_fields = ['id', 'timestamp', 'session_id']
     
     def get_analysis_data_display(self, obj):
         return obj.get_analysis_data()
+    
+    def get_image_renditions(self, obj):
+        return rendition_urls(obj.image, obj.renditions, self.context.get('request'))
+
+class SessionHistoryCompactSerializer(serializers.ModelSerializer):
+    """SessionHistorySerializer without analysis_data_display, which repeats analysis_data"""
+    image_renditions = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = SessionHistory
+        fields = ['id', 'session_id', 'user_input', 'response', 'image', 'image_renditions', 
+                 'analysis_data', 'timestamp']
+        read_only_fields = fields
+    
+    def get_image_renditions(self, obj):
+        return rendition_urls(obj.image, obj.renditions, self.context.get('request'))
 
 class ChatRequestSerializer(serializers.Serializer):
     query = serializers.CharField(required=False, allow_blank=True)
@@ -48,14 +71,18 @@ class OutfitAnalysisRequestSerializer(serializers.Serializer):
     image = serializers.ImageField(required=True)
     
     def validate_image(self, value):
-        # Validate file size (limit to 5MB)
-        if value.size > 5 * 1024 * 1024:
-            raise serializers.ValidationError("Image size exceeds 5MB limit")
+        # Validate file size (AI_UPLOAD_MAX_IMAGE_SIZE)
+        if value.size > max_image_size():
+            raise serializers.ValidationError(f"Image size exceeds {size_limit_message(max_image_size())} limit")
         
-        # Validate file type
-        allowed_types = ['image/jpeg', 'image/jpg', 'image/png']
-        if value.content_type not in allowed_types:
+        # Validate file type from its leading bytes; the client-sent content_type is not trusted
+        value.seek(0)
+        header = value.read(SNIFF_BYTES)
+        value.seek(0)
+        content_type = sniff_image_type(header)
+        if not content_type:
             raise serializers.ValidationError("Only JPEG and PNG images are allowed")
+        value.content_type = content_type
         
         return value
 
@@ -63,6 +90,15 @@ class TextQuerySerializer(serializers.Serializer):
     query = serializers.CharField(required=True)
     session_id = serializers.CharField(required=False)
 
+class AnalysisJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.UUIDField(source='id', read_only=True)
+    
+    class Meta:
+        model = AnalysisJob
+        fields = ['job_id', 'status', 'result', 'error', 'outfit_analysis', 
+                 'session_id', 'created_at', 'updated_at']
+        read_only_fields = fields
+
 # from rest_framework import serializers
 # from .models import SessionHistory
 
@@ -0,0 +1,129 @@
+import hashlib
+from uuid import uuid4
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from .models import SessionHistory, SessionSummary
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _context_cache():
+    return caches[getattr(settings, 'AI_SESSION_CONTEXT_CACHE_ALIAS', 'default')]
+
+
+def _context_key(session_id, user_id=None):
+    user_key = str(user_id) if user_id else ''
+    digest = hashlib.sha256(f"{session_id}:{user_key}".encode('utf-8')).hexdigest()
+    return f"session_context:{digest}"
+
+
+def _max_turns():
+    return getattr(settings, 'AI_HISTORY_MAX_TURNS', 10)
+
+
+def _timeout():
+    return getattr(settings, 'AI_SESSION_CONTEXT_TTL', 3600)
+
+
+def _empty_context():
+    return {'turns': [], 'summary': '', 'summarized_until': None}
+
+
+def _load_context_from_db(session_id, user_id=None):
+    """The session summary and latest turns (oldest first), one query each"""
+    summary = SessionSummary.objects.filter(
+        session_id=session_id, user_id=str(user_id) if user_id else ''
+    ).values('summary', 'summarized_until').first()
+
+    history = SessionHistory.objects.filter(session_id=session_id)
+    if user_id:
+        history = history.filter(user_id=str(user_id))
+    turns = list(history.order_by('-timestamp').values('user_input', 'response', 'timestamp')[:_max_turns()])
+    turns.reverse()
+
+    context = _empty_context()
+    context['turns'] = turns
+    if summary:
+        context.update(summary)
+    return context
+
+
+def get_session_context(session_id, user_id=None):
+    """Cached {'turns', 'summary', 'summarized_until'} of a session, loaded from the database on a miss"""
+    key = _context_key(session_id, user_id)
+    try:
+        context = _context_cache().get(key)
+    except Exception as e:
+        logger.warning(f"Error reading session context cache: {e}")
+        context = None
+
+    if context is None:
+        context = _load_context_from_db(session_id, user_id)
+        try:
+            _context_cache().set(key, context, _timeout())
+        except Exception as e:
+            logger.warning(f"Error writing session context cache: {e}")
+    return context
+
+
+def new_session_id(user_id=None):
+    """Mint a session id and cache its (empty) context so its first request skips the database"""
+    session_id = str(uuid4())
+    try:
+        _context_cache().set(_context_key(session_id, user_id), _empty_context(), _timeout())
+    except Exception as e:
+        logger.warning(f"Error writing session context cache: {e}")
+    return session_id
+
+
+def _update_cached_context(session_id, user_id, update):
+    """
+    Apply update() to the cached context under a per-session lock. A writer that finds the lock
+    taken drops the cached copy instead (the rows it describes are already committed), and flags
+    the race so the lock holder drops the copy it writes back too; the next read rebuilds it.
+    """
+    key = _context_key(session_id, user_id)
+    lock_key, raced_key = f"{key}:lock", f"{key}:raced"
+    cache = _context_cache()
+    try:
+        if cache.add(lock_key, 1, getattr(settings, 'AI_SESSION_CONTEXT_LOCK_TIMEOUT', 5)):
+            try:
+                cache.delete(raced_key)
+                context = cache.get(key)
+                # Only refresh copies that exist; a missing one is rebuilt from the database on the next read
+                if context is not None:
+                    update(context)
+                    cache.set(key, context, _timeout())
+                    if cache.get(raced_key):
+                        cache.delete(key)
+            finally:
+                cache.delete(lock_key)
+        else:
+            cache.set(raced_key, 1, getattr(settings, 'AI_SESSION_CONTEXT_LOCK_TIMEOUT', 5))
+            cache.delete(key)
+        if user_id:
+            # The anonymous view of a session spans every user's turns; let it reload
+            cache.delete(_context_key(session_id))
+    except Exception as e:
+        logger.warning(f"Error updating session context cache: {e}")
+
+
+def record_session_turn(entry):
+    """Write a saved SessionHistory row through to its session's cached context once committed"""
+    turn = {'user_input': entry.user_input, 'response': entry.response, 'timestamp': entry.timestamp}
+
+    def append(context):
+        context['turns'] = (context['turns'] + [turn])[-_max_turns():]
+
+    transaction.on_commit(lambda: _update_cached_context(entry.session_id, entry.user_id, append))
+
+
+def record_session_summary(summary):
+    """Write an updated SessionSummary through to its session's cached context once committed"""
+    def replace(context):
+        context['summary'] = summary.summary
+        context['summarized_until'] = summary.summarized_until
+
+    transaction.on_commit(lambda: _update_cached_context(summary.session_id, summary.user_id, replace))
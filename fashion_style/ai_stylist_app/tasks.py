@@ -0,0 +1,130 @@
+from celery import shared_task
+import logging
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from .models import AnalysisJob, SessionHistory, SessionSummary
+from .utils import (
+    analyze_outfit_with_ai,
+    record_outfit_analysis,
+    update_user_fields,
+    summarize_turns,
+    summary_lock_key,
+    summary_user_key,
+)
+from .session_store import record_session_summary
+from .renditions import RENDITION_FIELDS, generate_renditions, record_renditions, renditions_queue_key
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def analyze_outfit_job_task(job_id):
+    """
+    Celery task to run a queued outfit analysis and store the result on the job
+    """
+    try:
+        job = AnalysisJob.objects.select_related('user').get(pk=job_id)
+    except AnalysisJob.DoesNotExist:
+        logger.error(f"Analysis job {job_id} not found")
+        return
+    
+    if job.status == AnalysisJob.STATUS_SUCCEEDED:
+        return
+    
+    job.status = AnalysisJob.STATUS_RUNNING
+    job.save(update_fields=['status', 'updated_at'])
+    
+    try:
+        with job.image.open('rb') as image_file:
+            analysis = analyze_outfit_with_ai(image_file, job.session_id, job.user_id)
+        
+        # Point the analysis at the already stored upload instead of writing it again
+        outfit_analysis, outfit_data = record_outfit_analysis(job.user, job.session_id, job.image.name, analysis)
+        if job.user:
+            update_user_fields(job.user, outfit_data=outfit_data)
+        
+        job.status = AnalysisJob.STATUS_SUCCEEDED
+        job.result = analysis
+        job.outfit_analysis = outfit_analysis
+        job.error = ''
+        logger.info(f"Analysis job {job_id} succeeded")
+    except Exception as e:
+        job.status = AnalysisJob.STATUS_FAILED
+        job.error = str(e)
+        logger.error(f"Analysis job {job_id} failed: {str(e)}")
+    
+    job.save(update_fields=['status', 'result', 'outfit_analysis', 'error', 'updated_at'])
+    return job.status
+
+
+@shared_task
+def summarize_session_task(session_id, user_id=None):
+    """
+    Celery task to fold a session's older turns into its running summary,
+    leaving the most recent AI_SUMMARY_KEEP_RECENT_TURNS to be sent verbatim
+    """
+    try:
+        summary, _ = SessionSummary.objects.get_or_create(session_id=session_id, user_id=summary_user_key(user_id))
+        
+        turns = SessionHistory.objects.filter(session_id=session_id).order_by('timestamp')
+        if user_id:
+            turns = turns.filter(user_id=str(user_id))
+        if summary.summarized_until:
+            turns = turns.filter(timestamp__gt=summary.summarized_until)
+        turns = list(turns.only('user_input', 'response', 'timestamp'))
+        
+        to_fold = turns[:len(turns) - getattr(settings, 'AI_SUMMARY_KEEP_RECENT_TURNS', 4)]
+        if not to_fold:
+            return
+        
+        summary.summary = summarize_turns(summary.summary, to_fold)
+        summary.summarized_until = to_fold[-1].timestamp
+        summary.turns_summarized += len(to_fold)
+        summary.save(update_fields=['summary', 'summarized_until', 'turns_summarized', 'updated_at'])
+        record_session_summary(summary)
+        logger.info(f"Summarized {len(to_fold)} turns of session {session_id}")
+    except Exception as e:
+        logger.error(f"Summary of session {session_id} failed: {str(e)}")
+    finally:
+        cache.delete(summary_lock_key(session_id, user_id))
+
+@shared_task
+def generate_renditions_task(model_label, pk):
+    """
+    Celery task to write the thumbnail renditions of a row's image and record them on every row
+    sharing that file
+    """
+    image_field = next(image_field for label, image_field, _ in RENDITION_FIELDS if label == model_label)
+    model = apps.get_model(model_label)
+    row = model._default_manager.filter(pk=pk).values(image_field).first()
+    if not row or not row[image_field]:
+        return
+    source_name = row[image_field]
+    
+    # Release the dedupe key before recording: a row saved from here on queues its own task,
+    # one saved earlier is already committed and gets picked up by the update below
+    cache.delete(renditions_queue_key(source_name))
+    try:
+        renditions = generate_renditions(source_name)
+    except Exception as e:
+        logger.error(f"Renditions of {model_label} {pk} failed: {str(e)}")
+        return
+    
+    record_renditions(source_name, renditions)
+
+@shared_task
+def collect_orphaned_media_task():
+    """
+    Celery beat task to delete the next slice of media files no row references any more
+    """
+    from fashion_style.media_gc import collect_orphaned_media
+    
+    report = collect_orphaned_media()
+    if report is None:
+        logger.info("Orphaned media collection already running")
+        return None
+    logger.info(
+        f"Orphaned media: scanned {report['scanned']} files, deleted {report['deleted']}, "
+        f"reclaimed {report['bytes_reclaimed']} bytes"
+    )
+    return report
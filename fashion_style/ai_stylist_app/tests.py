@@ -1,3 +1,732 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from fashion_style import celery, db_routers, media_gc
+from fashion_style.storage import content_hash
+from fashion_style.db_routers import ReplicaRouter, is_pinned_to_primary, pin_to_primary, replica_reads
+
+from . import session_store, tokens, utils, views
+from .cache import get_analysis_cache_stats
+from .management.commands.check_query_plans import Command as CheckQueryPlansCommand, full_scans
+from .models import AnalysisJob, OutfitAnalysis, SessionHistory
+from .upload_handlers import ImageUploadGuardHandler
+
+ANALYSIS = {
+    "title": "Sage Glam",
+    "colors": ["#9CAF88"],
+    "description": "A sage dress. Gold accents.",
+    "advice": "Add gold hoops.",
+    "bullet_advice": ["Add gold hoops"],
+}
+
+
+def image_upload(color='red', fmt='JPEG', mode='RGB', size=(64, 64), name=None):
+    """An in-memory image upload"""
+    buffer = BytesIO()
+    Image.new(mode, size, color).save(buffer, fmt)
+    extension = 'jpg' if fmt == 'JPEG' else fmt.lower()
+    return SimpleUploadedFile(name or f"outfit.{extension}", buffer.getvalue(), content_type=f"image/{fmt.lower()}")
+
+
+def completion(content, finish_reason='stop', refusal=None, total_tokens=100):
+    """A chat completion shaped like the OpenAI client's"""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content, refusal=refusal), finish_reason=finish_reason)],
+        usage=SimpleNamespace(total_tokens=total_tokens, prompt_tokens=total_tokens - 20, completion_tokens=20),
+    )
+
+
+class TemporaryMediaMixin:
+    """Point MEDIA_ROOT at a scratch directory for the test"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class QueryPlanTests(TestCase):
+    """The hot SessionHistory/OutfitAnalysis queries must be served by an index (see check_query_plans)"""
+
+    def test_hot_queries_use_an_index(self):
+        command = CheckQueryPlansCommand(stdout=StringIO())
+        user = command._seed(sessions=300)
+        for label, queryset in command.hot_queries(user):
+            with self.subTest(query=label):
+                plan = queryset.explain()
+                self.assertEqual(full_scans(plan, connection.vendor), [], plan)
+
+
+class ReplicaRoutingTests(TestCase):
+    """Read-replica routing and read-your-writes stickiness (fashion_style.db_routers)"""
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user('replica@example.com', '+15550000001', 'pw12345!x', is_verified=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_reads_use_the_replica_only_inside_replica_reads(self):
+        router = ReplicaRouter()
+        with mock.patch.object(db_routers, 'replica_configured', return_value=True):
+            self.assertIsNone(router.db_for_read(None))
+            with replica_reads():
+                self.assertEqual(router.db_for_read(None), db_routers.REPLICA_ALIAS)
+                self.assertEqual(router.db_for_write(None), 'default')
+            self.assertIsNone(router.db_for_read(None))
+
+    def test_replica_requires_a_shared_cache(self):
+        with mock.patch.object(db_routers, 'replica_configured', return_value=True):
+            self.assertEqual([error.id for error in db_routers.check_primary_pin_cache()], ['fashion_style.E001'])
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}):
+                self.assertEqual(db_routers.check_primary_pin_cache(), [])
+        self.assertEqual(db_routers.check_primary_pin_cache(), [])
+
+    def test_reads_stay_on_the_primary_without_a_replica(self):
+        with mock.patch.object(db_routers, 'replica_configured', return_value=False), replica_reads():
+            self.assertIsNone(ReplicaRouter().db_for_read(None))
+
+    def test_writing_request_pins_the_user(self):
+        with mock.patch.object(db_routers, 'replica_configured', return_value=True):
+            response = self.client.patch('/api/profile/update/', {'full_name': 'Replica Tester'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(is_pinned_to_primary(self.user))
+
+    def test_read_only_request_does_not_pin_the_user(self):
+        with mock.patch.object(db_routers, 'replica_configured', return_value=True):
+            response = self.client.get('/api/profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(is_pinned_to_primary(self.user))
+
+    def test_history_reads_skip_the_replica_while_pinned(self):
+        entered = []
+
+        @contextmanager
+        def spy_replica_reads():
+            entered.append(True)
+            with replica_reads():
+                yield
+
+        # No replica is configured in tests, so the routed reads still land on 'default'
+        with mock.patch.object(db_routers, 'replica_reads', spy_replica_reads):
+            self.assertEqual(self.client.get('/api/ai/conversation-history/').status_code, 200)
+            self.assertEqual(len(entered), 1)
+
+            pin_to_primary(self.user)
+            self.assertEqual(self.client.get('/api/ai/conversation-history/').status_code, 200)
+            self.assertEqual(len(entered), 1)
+
+    def test_streamed_chat_turn_pins_the_user(self):
+        chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+            for text in ("Try ", "loafers")
+        ]
+        with mock.patch.object(db_routers, 'replica_configured', return_value=True), \
+                mock.patch.object(utils.client.chat.completions, 'create', return_value=iter(chunks)):
+            response = self.client.post('/api/ai/chat/', {'query': 'Shoes?', 'stream': 'true'}, format='multipart')
+            # The turn is saved once the stream has been sent, after the middleware returned
+            self.assertFalse(is_pinned_to_primary(self.user))
+            b''.join(response.streaming_content)
+        self.assertTrue(is_pinned_to_primary(self.user))
+
+
+class SessionContextCacheTests(TestCase):
+    """Write-through of saved turns to the cached session context (session_store)"""
+
+    def setUp(self):
+        cache.clear()
+        self.session_id = session_store.new_session_id()
+        self.key = session_store._context_key(self.session_id)
+
+    def append(self, text):
+        def update(context):
+            context['turns'] = context['turns'] + [{'user_input': text, 'response': '', 'timestamp': None}]
+        session_store._update_cached_context(self.session_id, None, update)
+
+    def test_update_appends_to_the_cached_context(self):
+        self.append('first')
+        self.assertEqual([turn['user_input'] for turn in cache.get(self.key)['turns']], ['first'])
+
+    def test_racing_update_drops_the_cached_context(self):
+        # Another writer holds the session's lock: this turn can't be merged, so the copy is dropped
+        cache.add(f"{self.key}:lock", 1)
+        self.append('second')
+        self.assertIsNone(cache.get(self.key))
+
+    def test_concurrent_updates_never_lose_a_turn(self):
+        barrier = threading.Barrier(8)
+
+        def worker(index):
+            barrier.wait()
+            self.append(f"turn {index}")
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Either every turn made it into the cached copy, or the copy was dropped for a reload
+        context = cache.get(self.key)
+        if context is not None:
+            self.assertEqual(len(context['turns']), 8)
+
+
+@override_settings(AI_UPLOAD_MAX_IMAGE_SIZE=1024 * 1024)
+class UploadGuardTests(TestCase):
+    """Uploads to the AI endpoints are refused while they stream in (upload_handlers.ImageUploadGuardHandler)"""
+
+    def setUp(self):
+        patcher = mock.patch.object(utils.client.chat.completions, 'create')
+        self.create = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, url, files):
+        return APIClient().post(url, files, format='multipart')
+
+    def assertRejected(self, response, status_code, error):
+        self.assertEqual(response.status_code, status_code)
+        self.assertEqual(response.data['error'], error)
+        self.create.assert_not_called()
+
+    def test_oversized_image_is_cut_off(self):
+        upload = SimpleUploadedFile('outfit.jpg', b'\xff\xd8\xff' + b'\0' * (1024 * 1024), content_type='image/jpeg')
+        response = self.post('/api/ai/analyze-outfit/', {'image': upload})
+        self.assertRejected(response, 413, "Image size exceeds 1MB limit")
+
+    def test_oversized_body_reports_the_image_limit(self):
+        # Over the image limit plus FORM_OVERHEAD: refused from Content-Length before any of it is read
+        upload = SimpleUploadedFile('outfit.jpg', b'\xff\xd8\xff' + b'\0' * (2 * 1024 * 1024 + 1), content_type='image/jpeg')
+        with mock.patch.object(ImageUploadGuardHandler, 'receive_data_chunk') as receive_data_chunk:
+            response = self.post('/api/ai/analyze-outfit/', {'image': upload})
+        self.assertRejected(response, 413, "Image size exceeds 1MB limit")
+        receive_data_chunk.assert_not_called()
+
+    def test_oversized_batch_reports_the_per_image_limit(self):
+        images = [
+            SimpleUploadedFile(f'outfit{index}.jpg', b'\xff\xd8\xff' + b'\0' * (1024 * 1024 - 16), content_type='image/jpeg')
+            for index in range(13)
+        ]
+        with override_settings(AI_BATCH_MAX_IMAGES=10):
+            response = self.post('/api/ai/analyze-outfit/batch/', {'images': images})
+        self.assertRejected(response, 413, "Upload exceeds the limit of 10 images of 1MB each")
+
+    def test_non_image_magic_bytes_are_refused(self):
+        upload = SimpleUploadedFile('outfit.jpg', b'GIF89a' + b'\0' * 64, content_type='image/jpeg')
+        response = self.post('/api/ai/analyze-outfit/', {'image': upload})
+        self.assertRejected(response, 400, "Only JPEG and PNG images are allowed")
+
+
+class AnalysisCacheTests(TestCase):
+    """Outfit analyses are cached by normalized image content and prompt version (ai_stylist_app.cache)"""
+
+    def setUp(self):
+        cache.clear()
+        caches['ai_analysis'].clear()
+        patcher = mock.patch.object(
+            utils.client.chat.completions, 'create', return_value=completion(json.dumps(ANALYSIS), total_tokens=120)
+        )
+        self.create = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_hit_skips_the_model(self):
+        first = utils.analyze_outfit_with_ai(image_upload('red'))
+        second = utils.analyze_outfit_with_ai(image_upload('red'))
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.create.call_count, 1)
+        stats = get_analysis_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['saved_tokens'], 120)
+
+    def test_changed_image_misses(self):
+        utils.analyze_outfit_with_ai(image_upload('red'))
+        utils.analyze_outfit_with_ai(image_upload('blue'))
+
+        self.assertEqual(self.create.call_count, 2)
+        self.assertEqual(get_analysis_cache_stats()['misses'], 2)
+
+    def test_changed_prompt_misses(self):
+        utils.analyze_outfit_with_ai(image_upload('red'))
+        with mock.patch.object(utils, 'SYSTEM_PROMPT', utils.SYSTEM_PROMPT + " Be brief."):
+            utils.analyze_outfit_with_ai(image_upload('red'))
+
+        self.assertEqual(self.create.call_count, 2)
+        self.assertEqual(get_analysis_cache_stats()['hits'], 0)
+
+
+class PreprocessImageTests(TestCase):
+    """Uploads are normalized to a bounded RGB JPEG before they reach the model (utils.preprocess_image)"""
+
+    def assertNormalized(self, upload, size):
+        with Image.open(BytesIO(utils.preprocess_image(upload))) as img:
+            self.assertEqual((img.format, img.mode), ('JPEG', 'RGB'))
+            self.assertEqual(img.size, size)
+        self.assertEqual(upload.tell(), 0)
+
+    def test_16_bit_greyscale_png(self):
+        self.assertNormalized(image_upload(3000, fmt='PNG', mode='I;16', size=(2048, 1024)), (1024, 512))
+
+    def test_palette_png(self):
+        self.assertNormalized(image_upload(7, fmt='PNG', mode='P', size=(1200, 1600)), (768, 1024))
+
+    def test_transparent_png_is_flattened_onto_white(self):
+        upload = image_upload((0, 0, 0, 0), fmt='PNG', mode='RGBA', size=(32, 32))
+        with Image.open(BytesIO(utils.preprocess_image(upload))) as img:
+            self.assertEqual(img.getpixel((0, 0)), (255, 255, 255))
+
+    def test_non_image_is_rejected(self):
+        with self.assertRaises(ValueError):
+            utils.preprocess_image(SimpleUploadedFile('outfit.png', b'not an image', content_type='image/png'))
+
+
+class BackgroundAnalysisTests(TemporaryMediaMixin, TestCase):
+    """Background outfit analyses are queued with a bounded publish (OutfitAnalysisView.enqueue_job)"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        caches['ai_analysis'].clear()
+        for target, name, value in (
+            (utils.client.chat.completions, 'create', completion(json.dumps(ANALYSIS))),
+            (celery, 'publish', None),  # rendition tasks
+        ):
+            patcher = mock.patch.object(target, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post_background(self, publish):
+        with mock.patch.object(views, 'publish', publish), self.captureOnCommitCallbacks(execute=True):
+            response = APIClient().post(
+                '/api/ai/analyze-outfit/', {'image': image_upload(), 'background': 'true'}, format='multipart'
+            )
+        self.assertEqual(response.status_code, 202)
+        publish.assert_called_once()
+        return AnalysisJob.objects.get(pk=response.data['job_id'])
+
+    def test_queued_job_is_left_to_the_worker(self):
+        job = self.post_background(mock.Mock())
+        self.assertEqual(job.status, AnalysisJob.STATUS_PENDING)
+        utils.client.chat.completions.create.assert_not_called()
+
+    def test_unreachable_broker_runs_the_job_in_process(self):
+        job = self.post_background(mock.Mock(side_effect=ConnectionRefusedError('no broker')))
+        self.assertEqual(job.status, AnalysisJob.STATUS_SUCCEEDED)
+        self.assertEqual(job.result['title'], ANALYSIS['title'])
+        self.assertIsNotNone(job.outfit_analysis_id)
+
+
+class StreamedChatTests(TestCase):
+    """Streamed answers are saved once sent, even when the client leaves early (views.stream_chat_response)"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('stream@example.com', '+15550000002', 'pw12345!x', is_verified=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+            for text in ("Try ", "white ", "loafers")
+        ]
+        patcher = mock.patch.object(utils.client.chat.completions, 'create', return_value=iter(chunks))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stream(self):
+        return self.client.post('/api/ai/chat/', {'query': 'Shoes?', 'stream': 'true'}, format='multipart')
+
+    def test_finished_stream_saves_the_turn(self):
+        b''.join(self.stream().streaming_content)
+        self.assertEqual(SessionHistory.objects.get(user_id=str(self.user.id)).response, "Try white loafers")
+
+    def test_disconnect_saves_the_text_already_sent(self):
+        response = self.stream()
+        events = iter(response.streaming_content)
+        next(events)  # start
+        next(events)  # first token
+        response.close()
+        self.assertEqual(SessionHistory.objects.get(user_id=str(self.user.id)).response, "Try ")
+
+    def test_save_failure_is_logged(self):
+        with mock.patch.object(views, 'record_chat_turn', side_effect=RuntimeError('db down')), \
+                self.assertLogs(views.logger, 'ERROR'):
+            body = b''.join(self.stream().streaming_content)
+        self.assertIn(b'event: done', body)
+
+
+class TokenizerLoadingTests(TestCase):
+    """The tokenizer is read from AI_TOKENIZER_CACHE_DIR and never downloaded while serving (tokens.load_encoding)"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.addCleanup(setattr, tokens, '_encoding', tokens._encoding)
+        environ = mock.patch.dict('os.environ')  # load_encoding points TIKTOKEN_CACHE_DIR at the setting
+        environ.start()
+        self.addCleanup(environ.stop)
+
+    @mock.patch.object(tokens.tiktoken, 'get_encoding')
+    def test_missing_file_estimates_without_downloading(self, get_encoding):
+        with override_settings(AI_TOKENIZER_CACHE_DIR=self.cache_dir), self.assertLogs(tokens.logger, 'WARNING'):
+            self.assertIsNone(tokens.load_encoding())
+        get_encoding.assert_not_called()
+        self.assertEqual(tokens.count_tokens("a" * 10), 3)
+
+    @mock.patch.object(tokens.tiktoken, 'get_encoding')
+    def test_cached_file_is_loaded(self, get_encoding):
+        open(tokens.cached_bpe_path(self.cache_dir), 'wb').close()
+        with override_settings(AI_TOKENIZER_CACHE_DIR=self.cache_dir):
+            self.assertIs(tokens.load_encoding(), get_encoding.return_value)
+        get_encoding.assert_called_once_with(tokens.TOKENIZER_ENCODING)
+
+
+class ParseAnalysisResponseTests(TestCase):
+    """Analysis JSON is recovered from untidy replies and failures are counted by cause (utils.parse_analysis_response)"""
+
+    def setUp(self):
+        cache.clear()
+
+    def assertFails(self, response, cause):
+        with self.assertRaises(utils.AnalysisParseError) as raised:
+            utils.parse_analysis_response(response)
+        self.assertEqual(raised.exception.cause, cause)
+
+    def test_code_fenced_json(self):
+        response = completion(f"```json\n{json.dumps(ANALYSIS, indent=2)}\n```")
+        self.assertEqual(utils.parse_analysis_response(response), ANALYSIS)
+
+    def test_json_wrapped_in_prose(self):
+        response = completion(f"Here is your analysis: {json.dumps(ANALYSIS)} Hope that helps {{:}}")
+        self.assertEqual(utils.parse_analysis_response(response), ANALYSIS)
+
+    def test_nested_braces(self):
+        analysis = dict(ANALYSIS, description="A {sage} dress", extra={"palette": {"warm": ["gold"]}})
+        self.assertEqual(utils.parse_analysis_response(completion(json.dumps(analysis))), analysis)
+
+    def test_refusal(self):
+        self.assertFails(completion(None, refusal="I can't help with that."), "refusal")
+
+    def test_truncated_reply(self):
+        self.assertFails(completion(json.dumps(ANALYSIS)[:40], finish_reason='length'), "truncated")
+
+    def test_failures_are_counted_by_cause(self):
+        self.assertFails(completion("Sorry, no outfit here."), "no_json")
+        self.assertFails(completion('{"title": "Sage'), "invalid_json")
+        self.assertFails(completion(json.dumps({"title": "Sage Glam"})), "missing_keys")
+        self.assertFails(completion(json.dumps(dict(ANALYSIS, colors="#9CAF88"))), "wrong_types")
+        self.assertFails(completion(json.dumps(ANALYSIS)[:40], finish_reason='length'), "truncated")
+        utils.parse_analysis_response(completion(json.dumps(ANALYSIS)))
+
+        stats = utils.get_analysis_parse_stats()
+        self.assertEqual(stats['parsed'], 1)
+        self.assertEqual(stats['failed'], 5)
+        self.assertEqual(
+            {cause: count for cause, count in stats['failures'].items() if count},
+            {'no_json': 1, 'invalid_json': 1, 'missing_keys': 1, 'wrong_types': 1, 'truncated': 1},
+        )
+
+
+class AsyncViewTests(TemporaryMediaMixin, TestCase):
+    """The /api/ai/async/ views await the async OpenAI client and never touch the blocking one (async_views)"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        caches['ai_analysis'].clear()
+        self.user = get_user_model().objects.create_user('async@example.com', '+15550000003', 'pw12345!x', is_verified=True)
+        self.headers = {'Authorization': f"Bearer {AccessToken.for_user(self.user)}"}
+        self.async_create = mock.AsyncMock()
+        for target, name, value in (
+            (utils.async_client.chat.completions, 'create', self.async_create),
+            (utils.client.chat.completions, 'create', mock.Mock(side_effect=AssertionError("blocking client used"))),
+        ):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_text_query(self):
+        self.async_create.return_value = completion("Pair it with loafers.")
+        response = await self.async_client.post(
+            '/api/ai/async/text-query/', {'query': 'Shoes?'}, content_type='application/json', headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['response'], "Pair it with loafers.")
+        self.async_create.assert_awaited_once()
+        turn = await SessionHistory.objects.aget(user_id=str(self.user.id))
+        self.assertEqual(turn.response, "Pair it with loafers.")
+
+    async def test_outfit_analysis(self):
+        self.async_create.return_value = completion(json.dumps(ANALYSIS))
+        response = await self.async_client.post(
+            '/api/ai/async/analyze-outfit/', {'image': image_upload()}, headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], ANALYSIS['title'])
+        self.async_create.assert_awaited_once()
+        self.assertEqual(await OutfitAnalysis.objects.filter(user=self.user).acount(), 1)
+
+    async def test_chat_rejects_a_non_image_upload(self):
+        upload = SimpleUploadedFile('outfit.jpg', b'GIF89a' + b'\0' * 64, content_type='image/jpeg')
+        response = await self.async_client.post('/api/ai/async/chat/', {'image': upload}, headers=self.headers)
+
+        self.assertEqual(response.status_code, 400)
+        self.async_create.assert_not_awaited()
+
+
+class OutfitAnalysisBatchTests(TemporaryMediaMixin, TestCase):
+    """A batch fans out the model calls and saves the successes with one INSERT (OutfitAnalysisBatchView)"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        caches['ai_analysis'].clear()
+        self.user = get_user_model().objects.create_user('batch@example.com', '+15550000004', 'pw12345!x', is_verified=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        patcher = mock.patch.object(celery, 'publish')  # rendition tasks
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_mixed_batch_reports_per_item_errors_and_saves_once(self):
+        replies = {
+            'green': completion(json.dumps(ANALYSIS)),
+            'blue': completion("Sorry, I can't see an outfit."),
+        }
+
+        def create(**kwargs):
+            # The preprocessed image travels as a data URL; tell the uploads apart by their decoded color
+            image_url = next(part for part in kwargs['messages'][-1]['content'] if part['type'] == 'image_url')
+            with Image.open(BytesIO(base64.b64decode(image_url['image_url']['url'].split(',', 1)[1]))) as img:
+                red, green, blue = img.convert('RGB').getpixel((0, 0))
+            return replies['green' if green > blue else 'blue']
+
+        images = [
+            image_upload('green', name='first.jpg'),
+            SimpleUploadedFile('second.jpg', b'GIF89a' + b'\0' * 64, content_type='image/jpeg'),
+            image_upload('blue', name='third.jpg'),
+        ]
+        with mock.patch.object(utils.client.chat.completions, 'create', side_effect=create), \
+                mock.patch.object(OutfitAnalysis.objects, 'bulk_create', wraps=OutfitAnalysis.objects.bulk_create) as bulk_create:
+            response = self.client.post('/api/ai/analyze-outfit/batch/', {'images': images}, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['succeeded'], response.data['failed']), (1, 2))
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['ok', 'error', 'error'])
+        self.assertEqual(results[0]['analysis']['title'], ANALYSIS['title'])
+        self.assertIn('Analysis failed', results[2]['error'])
+        bulk_create.assert_called_once()
+        self.assertEqual(OutfitAnalysis.objects.get(user=self.user).pk, results[0]['id'])
+
+
+@override_settings(AI_SESSION_HISTORY_LIMIT=5, AI_SESSION_SUMMARIES_ENABLED=False)
+class SessionHistoryPruningTests(TestCase):
+    """Saving a turn prunes the session to its latest AI_SESSION_HISTORY_LIMIT turns (utils.save_session_history)"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('pruned@example.com', '+15550000005', 'pw12345!x', is_verified=True)
+
+    def save_turns(self, count, image_every=0):
+        queries = []
+        for index in range(count):
+            image = f"outfit_images/{index}.jpg" if image_every and index % image_every == 0 else None
+            with CaptureQueriesContext(connection) as captured:
+                utils.save_session_history('pruned-session', f"question {index}", f"answer {index}",
+                                           user_id=self.user.id, image=image)
+            queries.append(len(captured))
+        return queries
+
+    def test_only_the_latest_turns_are_kept(self):
+        SessionHistory.objects.create(session_id='pruned-session', user_id='8', user_input="other user", response="")
+        self.save_turns(12)
+
+        retained = SessionHistory.objects.filter(session_id='pruned-session', user_id=str(self.user.id)).order_by('timestamp', 'id')
+        self.assertEqual([turn.user_input for turn in retained], [f"question {index}" for index in range(7, 12)])
+        self.assertEqual(SessionHistory.objects.filter(user_id='8').count(), 1)
+
+    def test_each_save_of_a_full_session_costs_the_same_queries(self):
+        queries = self.save_turns(12)
+        # SAVEPOINT, INSERT, counting what is pruned, one set-based DELETE, the counter UPDATE, RELEASE:
+        # no per-row work however much is pruned
+        self.assertEqual(set(queries[5:]), {6}, queries)
+
+    def test_counters_follow_the_retained_history(self):
+        self.save_turns(12, image_every=3)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.conversation_count, self.user.get_conversation_history().count())
+        self.assertEqual(self.user.outfit_analysis_count, self.user.get_outfit_analyses().count())
+        self.assertEqual((self.user.conversation_count, self.user.outfit_analysis_count), (5, 1))
+
+
+@override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='')
+class ProtectedMediaTests(TemporaryMediaMixin, TestCase):
+    """Media is only served to its owners, with validators and byte ranges (fashion_style.media_views)"""
+
+    body = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        self.owner = User.objects.create_user('owner@example.com', '+15550000006', is_verified=True)
+        self.stranger = User.objects.create_user('stranger@example.com', '+15550000007', is_verified=True)
+        digest = content_hash(SimpleUploadedFile('outfit.jpg', self.body))
+        self.name = f"content/{digest[:2]}/{digest}.jpg"
+        self.etag = f'"{digest}"'
+        os.makedirs(os.path.join(self.media_root, 'content', digest[:2]))
+        with open(os.path.join(self.media_root, *self.name.split('/')), 'wb') as file:
+            file.write(self.body)
+        with open(os.path.join(self.media_root, 'secret.txt'), 'wb') as file:
+            file.write(b'not an upload')
+        OutfitAnalysis.objects.create(
+            user=self.owner, image=self.name, title="Sage Glam", colors=[], description="", advice="", bullet_advice=[]
+        )
+
+    def get(self, path=None, user=None, **headers):
+        client = APIClient()
+        if user:
+            client.force_authenticate(user)
+        return client.get(path or f'/media/{self.name}', headers=headers)
+
+    def test_owner_gets_the_file_with_an_etag(self):
+        response = self.get(user=self.owner)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.body)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_matching_if_none_match_is_not_modified(self):
+        response = self.get(user=self.owner, If_None_Match=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], self.etag)
+
+    def test_range(self):
+        response = self.get(user=self.owner, Range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.body[10:20])
+        self.assertEqual(response['Content-Range'], f"bytes 10-19/{len(self.body)}")
+
+        response = self.get(user=self.owner, Range='bytes=-5')
+        self.assertEqual(response.content, self.body[-5:])
+
+    def test_unsatisfiable_range(self):
+        response = self.get(user=self.owner, Range=f'bytes={len(self.body)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f"bytes */{len(self.body)}")
+
+    def test_if_range_only_honours_the_current_etag(self):
+        response = self.get(user=self.owner, Range='bytes=0-3', If_Range=self.etag)
+        self.assertEqual((response.status_code, response.content), (206, self.body[:4]))
+
+        for stale in ('"0123abcd"', 'Wed, 21 Oct 2015 07:28:00 GMT'):
+            with self.subTest(if_range=stale):
+                response = self.get(user=self.owner, Range='bytes=0-3', If_Range=stale)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(b''.join(response.streaming_content), self.body)
+
+    def test_other_users_files_are_not_found(self):
+        self.assertEqual(self.get(user=self.stranger).status_code, 404)
+        self.assertEqual(self.get().status_code, 404)
+
+    def test_paths_outside_the_uploads_are_not_found(self):
+        for path in ('/media/secret.txt', '/media/content/../secret.txt', '/media/../manage.py', '/media/%2e%2e/manage.py'):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path, user=self.owner).status_code, 404)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_proxy_sends_the_file(self):
+        response = self.get(user=self.owner)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(MEDIA_GC_BATCH_PAUSE=0, MEDIA_RELEASE_GRACE_SECONDS=300)
+class OrphanedMediaCollectionTests(TemporaryMediaMixin, TestCase):
+    """Unreferenced upload files are collected in checkpointed slices (fashion_style.media_gc)"""
+
+    def setUp(self):
+        super().setUp()
+        self.referenced = self.write('content/aa/' + 'a' * 64 + '.jpg', age=2 * 86400)
+        self.orphan = self.write('content/bb/' + 'b' * 64 + '.jpg', age=2 * 86400)
+        self.recent = self.write('outfit_images/recent.jpg', age=60)
+        self.outside = self.write('exports/report.csv', age=2 * 86400)  # not an upload directory
+        OutfitAnalysis.objects.create(
+            image=self.referenced, title="Sage Glam", colors=[], description="", advice="", bullet_advice=[]
+        )
+
+    def write(self, name, age):
+        path = os.path.join(self.media_root, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'x' * 10)
+        modified = time.time() - age
+        os.utime(path, (modified, modified))
+        return name
+
+    def remaining(self):
+        return {name for name in (self.referenced, self.orphan, self.recent, self.outside)
+                if os.path.exists(os.path.join(self.media_root, *name.split('/')))}
+
+    def test_dry_run_reports_without_deleting(self):
+        report = media_gc.collect_orphaned_media(grace=86400, dry_run=True)
+
+        self.assertEqual((report['scanned'], report['orphaned'], report['deleted']), (3, 1, 0))
+        self.assertEqual(report['bytes_reclaimed'], 10)
+        self.assertEqual(self.remaining(), {self.referenced, self.orphan, self.recent, self.outside})
+        self.assertEqual(media_gc.read_checkpoint(self.media_root), '')
+
+    def test_only_old_unreferenced_uploads_are_deleted(self):
+        report = media_gc.collect_orphaned_media(grace=86400)
+
+        self.assertEqual((report['orphaned'], report['deleted'], report['complete']), (1, 1, True))
+        self.assertEqual(self.remaining(), {self.referenced, self.recent, self.outside})
+
+    def test_grace_never_drops_below_the_release_grace(self):
+        # A minute-old file is inside MEDIA_RELEASE_GRACE_SECONDS even when asked for no grace at all
+        media_gc.collect_orphaned_media(grace=0)
+        self.assertEqual(self.remaining(), {self.referenced, self.recent, self.outside})
+
+        with override_settings(MEDIA_RELEASE_GRACE_SECONDS=30):
+            media_gc.collect_orphaned_media(grace=0)
+        self.assertEqual(self.remaining(), {self.referenced, self.outside})
+
+    def test_runs_resume_from_the_checkpoint(self):
+        first = media_gc.collect_orphaned_media(limit=2, batch_size=1, grace=86400)
+        self.assertEqual((first['start'], first['checkpoint'], first['complete']), ('', self.orphan, False))
+        self.assertEqual(media_gc.read_checkpoint(self.media_root), self.orphan)
+
+        second = media_gc.collect_orphaned_media(limit=2, batch_size=1, grace=86400)
+        self.assertEqual((second['start'], second['scanned'], second['complete']), (self.orphan, 1, True))
+        # A finished pass starts over next time
+        self.assertEqual(media_gc.read_checkpoint(self.media_root), '')
+        self.assertEqual(self.remaining(), {self.referenced, self.recent, self.outside})
+
+    def test_a_running_collection_is_not_joined(self):
+        self.assertTrue(media_gc.acquire_lock(self.media_root, timeout=3600))
+        self.assertIsNone(media_gc.collect_orphaned_media())
+        media_gc.release_lock(self.media_root)
+        self.assertIsNotNone(media_gc.collect_orphaned_media())
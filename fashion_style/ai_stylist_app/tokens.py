@@ -0,0 +1,75 @@
+import hashlib
+import logging
+import os
+from django.conf import settings
+
+try:
+    import tiktoken
+except ImportError:  # optional; token counts fall back to a character estimate
+    tiktoken = None
+
+# The encoding gpt-4o uses, and where tiktoken downloads it from
+TOKENIZER_ENCODING = "o200k_base"
+TOKENIZER_BPE_URL = "https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken"
+CHARS_PER_TOKEN = 4
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+
+
+def cached_bpe_path(cache_dir):
+    """Where tiktoken keeps the downloaded BPE file (named by the SHA-1 of its URL)"""
+    return os.path.join(cache_dir, hashlib.sha1(TOKENIZER_BPE_URL.encode()).hexdigest())
+
+
+def load_encoding(download=False):
+    """
+    Load the tokenizer from AI_TOKENIZER_CACHE_DIR, downloading the BPE file into it only when
+    `download` is set; called once at startup so no request ever waits on the fetch
+    """
+    global _encoding
+    _encoding = False
+    if tiktoken is None:
+        return None
+    
+    cache_dir = getattr(settings, 'AI_TOKENIZER_CACHE_DIR', '')
+    if cache_dir:
+        os.environ['TIKTOKEN_CACHE_DIR'] = cache_dir
+    if not download and not (cache_dir and os.path.exists(cached_bpe_path(cache_dir))):
+        logger.warning(f"Tokenizer file missing from {cache_dir!r}, estimating token counts; run `manage.py fetch_tokenizer`")
+        return None
+    
+    try:
+        _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning(f"Error loading tokenizer, estimating token counts instead: {e}")
+    return _encoding or None
+
+
+def _get_encoding():
+    """The model's tiktoken encoding, or None when tiktoken or its BPE file is unavailable"""
+    if _encoding is None:
+        load_encoding()
+    return _encoding or None
+
+
+def count_tokens(text):
+    """Number of tokens text costs in a prompt"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Keep the beginning of text that fits in max_tokens"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text[:max_tokens * CHARS_PER_TOKEN]
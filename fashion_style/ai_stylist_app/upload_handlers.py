@@ -0,0 +1,122 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import MultiPartParser
+
+# Leading bytes of the only image formats the AI endpoints accept
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+]
+SNIFF_BYTES = max(len(signature) for signature, _ in IMAGE_SIGNATURES)
+FORM_OVERHEAD = 1024 * 1024  # multipart headers and text fields on top of the images
+
+
+class UploadRejected(APIException):
+    """Raised while the multipart body is still streaming in; the rest of it is never read"""
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = "Invalid upload"
+
+    def __init__(self, detail=None, status_code=None):
+        super().__init__(detail)
+        if status_code is not None:
+            self.status_code = status_code
+
+
+def sniff_image_type(header):
+    """'image/jpeg' or 'image/png' from a file's first bytes, or None"""
+    for signature, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return content_type
+    return None
+
+
+def max_image_size():
+    return getattr(settings, 'AI_UPLOAD_MAX_IMAGE_SIZE', 5 * 1024 * 1024)
+
+
+def max_request_size(max_files=1):
+    # Room for every allowed image plus the form fields
+    return max_files * max_image_size() + FORM_OVERHEAD
+
+
+def size_limit_message(limit):
+    return f"{limit // (1024 * 1024)}MB"
+
+
+def oversized_upload_message(max_files=1):
+    """The limit as users meet it: per image, whatever FORM_OVERHEAD the body is allowed on top"""
+    image_limit = size_limit_message(max_image_size())
+    if max_files == 1:
+        return f"Image size exceeds {image_limit} limit"
+    return f"Upload exceeds the limit of {max_files} images of {image_limit} each"
+
+
+class ImageUploadGuardHandler(FileUploadHandler):
+    """
+    First upload handler of the AI endpoints: rejects an oversized body from its Content-Length,
+    a non-JPEG/PNG file from its first chunk and an oversized file as soon as it passes the cap,
+    before the memory/temporary-file handlers behind it buffer any more of it.
+    With reject_invalid=False a non-image file is cut down to its first bytes instead, so a view
+    validating uploads one by one (the batch endpoint) can report it as a per-item error.
+    """
+    chunk_size = 16 * 1024  # the parser reads the body in the smallest chunk size of its handlers
+
+    def __init__(self, request=None, max_files=1, reject_invalid=True):
+        super().__init__(request)
+        self.max_files = max_files
+        self.reject_invalid = reject_invalid
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length and content_length > max_request_size(self.max_files):
+            raise UploadRejected(oversized_upload_message(self.max_files), status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.invalid = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > max_image_size():
+            raise UploadRejected(oversized_upload_message(), status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        if self.invalid:
+            return None  # the handlers behind this one keep only the header
+        if len(self.header) < SNIFF_BYTES:
+            self.header += raw_data[:SNIFF_BYTES - len(self.header)]
+            if len(self.header) >= SNIFF_BYTES and not sniff_image_type(self.header):
+                if self.reject_invalid:
+                    raise UploadRejected("Only JPEG and PNG images are allowed")
+                self.invalid = True
+                return raw_data[:SNIFF_BYTES]
+        return raw_data
+
+    def file_complete(self, file_size):
+        # Files shorter than the longest signature never reached the check above
+        if self.reject_invalid and not sniff_image_type(self.header):
+            raise UploadRejected("Only JPEG and PNG images are allowed")
+        return None
+
+
+def guard_uploads(request, max_files=1, reject_invalid=True):
+    """Put ImageUploadGuardHandler in front of a Django request's upload handlers (before it is parsed)"""
+    request.upload_handlers = [ImageUploadGuardHandler(request, max_files, reject_invalid), *request.upload_handlers]
+
+
+class GuardedMultiPartParser(MultiPartParser):
+    """
+    MultiPartParser for image endpoints; rejects bad uploads while they stream (see ImageUploadGuardHandler).
+    Views accepting several images set max_upload_files; views reporting bad files per item
+    set reject_invalid_uploads = False.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        view = parser_context.get('view')
+        max_files = getattr(view, 'max_upload_files', 1)
+        reject_invalid = getattr(view, 'reject_invalid_uploads', True)
+        guard_uploads(parser_context['request']._request, max_files, reject_invalid)
+        return super().parse(stream, media_type, parser_context)
@@ -1,16 +1,27 @@
 from django.urls import path
 from . import views
+from . import async_views
 
 urlpatterns = [
     # Main AI endpoints
     path('analyze-outfit/', views.OutfitAnalysisView.as_view(), name='analyze-outfit'),
+    path('analyze-outfit/batch/', views.OutfitAnalysisBatchView.as_view(), name='analyze-outfit-batch'),
+    path('analysis-jobs/<uuid:job_id>/', views.AnalysisJobView.as_view(), name='analysis-job'),
     path('text-query/', views.TextQueryView.as_view(), name='text-query'),
     path('chat/', views.ChatView.as_view(), name='ai-chat'),
     
+    # Async AI endpoints (serve with an ASGI worker, e.g. uvicorn)
+    path('async/analyze-outfit/', async_views.AsyncOutfitAnalysisView.as_view(), name='async-analyze-outfit'),
+    path('async/text-query/', async_views.AsyncTextQueryView.as_view(), name='async-text-query'),
+    path('async/chat/', async_views.AsyncChatView.as_view(), name='async-ai-chat'),
+    
     # User history endpoints
     path('outfit-history/', views.UserOutfitHistoryView.as_view(), name='outfit-history'),
     path('conversation-history/', views.UserConversationHistoryView.as_view(), name='conversation-history'),
     path('outfit-analysis/<int:pk>/', views.OutfitAnalysisDetailView.as_view(), name='outfit-analysis-detail'),
+    
+    # Admin metrics
+    path('metrics/', views.AIMetricsView.as_view(), name='ai-metrics'),
 ]
 
 # from django.urls import path
@@ -1,15 +1,34 @@
 import os
 import base64
+import hashlib
 import re
 import json
-from PIL import Image
+import time
+import logging
+from datetime import datetime
+from PIL import Image, ImageOps
 from io import BytesIO
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from .models import SessionHistory
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from fashion_app.models import User, UserActivity
+from fashion_style.db_routers import pin_after_write
+from .models import SessionHistory, OutfitAnalysis
+from .cache import analysis_cache_key, get_cached_analysis, cache_analysis
+from . import metrics
+from .tokens import count_tokens, truncate_to_tokens
+from .session_store import get_session_context, record_session_turn
+
+logger = logging.getLogger(__name__)
 
 # Initialize OpenAI client
 client = OpenAI(api_key=settings.OPENAI_API_KEY)
+async_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
 # Define prompts
 # PHOTO_PROMPT = """Analyze the outfit in the provided image and respond with a compact JSON object:
@@ -35,6 +54,30 @@ client = OpenAI(api_key=settings.OPENAI_API_KEY)
 # - For image analysis, follow the provided photo prompt strictly and return only the JSON object.
 # - For text queries, provide relevant fashion advice based on the input and conversation history.
 # - Use conversation history to maintain context and relevance."""
+
+# Appended to PHOTO_PROMPT when the user asks a question alongside the photo
+COMBINED_PROMPT = """
+- Also add an "answer" key to the same JSON object: your reply to the user's question below, written as you would answer it in chat (1-3 sentences, using the analysis above as context).
+User question: {query}"""
+
+ANALYSIS_KEYS = ["title", "colors", "description", "advice", "bullet_advice"]
+COMBINED_KEYS = ANALYSIS_KEYS + ["answer"]
+
+# JSON schema the model is held to in structured-output mode
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "colors": {"type": "array", "items": {"type": "string"}},
+        "description": {"type": "string"},
+        "advice": {"type": "string"},
+        "bullet_advice": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ANALYSIS_KEYS,
+    "additionalProperties": False,
+}
+
+PARSE_FAILURE_CAUSES = ["refusal", "truncated", "no_json", "invalid_json", "missing_keys", "wrong_types"]
 PHOTO_PROMPT = """Analyze the outfit in the provided image and respond with a compact JSON object:
 {"title": "Short creative title based on the outfit description (maximum 3 words)",
  "colors": ["color1", "color2", ...],
@@ -61,93 +104,448 @@ SYSTEM_PROMPT = """You are Stailas, an AI fashion stylist designed to help users
 - For image analysis, follow the provided photo prompt strictly and return only the JSON object.
 - For text queries, provide relevant fashion advice based on the input and conversation history.
 - Use conversation history to maintain context and relevance."""
-def encode_image(image_file):
-    """Encode image to base64 for OpenAI API"""
+
+ANALYSIS_MODEL = "gpt-4o"
+
+HISTORY_HEADER = "\nConversation history:\n"
+SUMMARY_HEADER = "\nSummary of the earlier conversation:\n"
+
+SUMMARY_PROMPT = """You maintain the running summary of a styling conversation between a user and Stailas, an AI fashion stylist.
+Update the existing summary with the new turns. Keep what later answers depend on: the user's preferences, body and style notes, occasions, wardrobe items, outfits analysed and advice already given.
+Write compact plain-text notes in the third person, no greetings, at most 150 words."""
+
+PROMPT_TOKEN_ENDPOINTS = ["analysis", "combined", "text_query", "summary"]
+
+TEXT_QUERY_FALLBACK = "Sorry, I couldn't process that. Try another question! 😊"
+
+
+def get_prompt_version():
+    """Short fingerprint of the model and prompts that produce an analysis"""
+    fingerprint = "\n".join([ANALYSIS_MODEL, SYSTEM_PROMPT, PHOTO_PROMPT, json.dumps(ANALYSIS_SCHEMA, sort_keys=True)])
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()[:12]
+
+def preprocess_image(image_file):
+    """Decode an upload once and return compact, metadata-free JPEG bytes bounded to AI_IMAGE_MAX_EDGE"""
+    max_edge = getattr(settings, 'AI_IMAGE_MAX_EDGE', 1024)
+    quality = getattr(settings, 'AI_IMAGE_JPEG_QUALITY', 85)
     try:
-        # Read and validate image
+        image_file.seek(0)
         img = Image.open(image_file)
-        img.verify()  # Verify image integrity
-        img = Image.open(image_file)  # Reopen after verify
-        img_format = img.format.lower()
+        img_format = (img.format or '').lower()
         
         if img_format not in ['jpeg', 'jpg', 'png']:
             raise ValueError("Unsupported image format")
         
-        # Convert to JPEG if PNG to ensure compatibility
-        if img_format == 'png':
-            buffer = BytesIO()
-            img.convert('RGB').save(buffer, format="JPEG", quality=85)
-            img_data = buffer.getvalue()
-        else:
-            buffer = BytesIO()
-            img.save(buffer, format=img_format, quality=85)
-            img_data = buffer.getvalue()
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale instead of materialising the full frame
+        if img_format in ['jpeg', 'jpg']:
+            img.draft('RGB', (max_edge, max_edge))
+        
+        # load() decodes once and fails on truncated/corrupt data, replacing verify() + reopen
+        img.load()
+        ImageOps.exif_transpose(img, in_place=True)
+        
+        # Flatten to RGB before resizing: thumbnail() rejects modes such as 16-bit greyscale (I;16)
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            rgba = img.convert('RGBA')
+            img = Image.new('RGB', rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel('A'))
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
         
-        return base64.b64encode(img_data).decode('utf-8')
+        # Integer box reduction first, then a cheap bicubic pass; plenty for the vision model
+        img.thumbnail((max_edge, max_edge), Image.Resampling.BICUBIC, reducing_gap=1.0)
+        
+        # Saving without exif/icc arguments drops the source metadata
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG", quality=quality, optimize=True)
+        return buffer.getvalue()
     except Exception as e:
         raise ValueError(f"Invalid image: {str(e)}")
+    finally:
+        # The upload is saved to storage afterwards, so hand it back rewound
+        try:
+            image_file.seek(0)
+        except Exception:
+            pass
+
+def encode_image(image_file):
+    """Encode image to base64 for OpenAI API"""
+    return base64.b64encode(preprocess_image(image_file)).decode('utf-8')
+
+def get_history_token_budget(endpoint):
+    """Prompt tokens the conversation history may use on an endpoint"""
+    budgets = getattr(settings, 'AI_HISTORY_TOKEN_BUDGETS', {})
+    return budgets.get(endpoint, budgets.get('default', 1000))
+
+def summary_user_key(user_id):
+    """SessionSummary.user_id value for a (possibly anonymous) user"""
+    return str(user_id) if user_id else ''
+
+def unsummarized_turns(context):
+    """Turns of a session context that are not yet folded into its summary, oldest first"""
+    summarized_until = context['summarized_until']
+    if context['summary'] and summarized_until:
+        return [turn for turn in context['turns'] if turn['timestamp'] > summarized_until]
+    return context['turns']
 
-def get_session_history(session_id, user_id=None):
-    """Get conversation history for context"""
+def get_session_history(session_id, user_id=None, endpoint='text_query'):
+    """Get conversation context: the session summary plus the newest unsummarized turns within the endpoint's token budget"""
     try:
-        query = SessionHistory.objects.filter(session_id=session_id).order_by('timestamp')
-        if user_id:
-            query = query.filter(user_id=str(user_id))
-        
-        history = query[:10]  # Last 10 interactions
-        
-        if history.exists():
-            history_context = "\nConversation history:\n" + "\n".join([
-                f"User: {entry.user_input}\nStailas: {entry.response}" 
-                for entry in history
-            ])
-            return history_context
-        return ""
+        budget = get_history_token_budget(endpoint)
+        context = get_session_context(session_id, user_id)
+        
+        summary_context = ""
+        if context['summary']:
+            summary_context = SUMMARY_HEADER + truncate_to_tokens(context['summary'], budget // 2)
+            budget -= count_tokens(summary_context)
+        
+        budget -= count_tokens(HISTORY_HEADER)
+        turns = []
+        for entry in reversed(unsummarized_turns(context)):
+            turn = f"User: {entry['user_input']}\nStailas: {entry['response']}"
+            turn_tokens = count_tokens(turn) + 1  # joining newline
+            if turn_tokens > budget:
+                # An oversized latest turn is cut down rather than dropping all context
+                if not turns:
+                    turns.append(truncate_to_tokens(turn, budget - 1))
+                break
+            turns.append(turn)
+            budget -= turn_tokens
+        
+        turns = [turn for turn in turns if turn]
+        if turns:
+            return summary_context + HISTORY_HEADER + "\n".join(reversed(turns))
+        return summary_context
     except Exception:
         return ""
 
+def summarize_turns(previous_summary, turns):
+    """Fold conversation turns into a session summary with the cheap summary model"""
+    max_turn_tokens = getattr(settings, 'AI_SUMMARY_MAX_TURN_TOKENS', 400)
+    transcript = "\n".join(
+        truncate_to_tokens(f"User: {turn.user_input}\nStailas: {turn.response}", max_turn_tokens)
+        for turn in turns
+    )
+    response = client.chat.completions.create(
+        model=getattr(settings, 'AI_SUMMARY_MODEL', 'gpt-4o-mini'),
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"}
+        ],
+        max_tokens=getattr(settings, 'AI_SUMMARY_MAX_TOKENS', 250)
+    )
+    record_prompt_tokens('summary', response.usage)
+    return response.choices[0].message.content.strip()
+
+def summary_lock_key(session_id, user_id=None):
+    return f"session_summary_lock:{session_id}:{summary_user_key(user_id)}"
+
+def schedule_session_summary(session_id, user_id=None):
+    """Queue a background summary update once enough unsummarized turns have piled up"""
+    if not getattr(settings, 'AI_SESSION_SUMMARIES_ENABLED', True):
+        return
+    keep = getattr(settings, 'AI_SUMMARY_KEEP_RECENT_TURNS', 4)
+    every = getattr(settings, 'AI_SUMMARY_EVERY_TURNS', 4)
+    
+    # The cached context holds the latest AI_HISTORY_MAX_TURNS turns, enough to see the threshold
+    if len(unsummarized_turns(get_session_context(session_id, user_id))) < keep + every:
+        return
+    
+    # One summary job per session at a time; the task releases the lock
+    lock_key = summary_lock_key(session_id, user_id)
+    if not cache.add(lock_key, 1, timeout=getattr(settings, 'AI_SUMMARY_LOCK_TIMEOUT', 300)):
+        return
+    
+    def enqueue():
+        from fashion_style.celery import publish
+        from .tasks import summarize_session_task
+        try:
+            publish(summarize_session_task, session_id, user_id)
+        except Exception as e:
+            # No broker: the turns stay in the verbatim history. Keep the lock for a while as a
+            # backoff so the following turns don't each wait on the broker again.
+            cache.set(lock_key, 1, timeout=getattr(settings, 'AI_SUMMARY_RETRY_BACKOFF', 60))
+            logger.warning(f"Could not queue summary for session {session_id}: {e}")
+    
+    transaction.on_commit(enqueue)
+
+def record_prompt_tokens(endpoint, usage):
+    """Count the prompt tokens a request to the model actually sent"""
+    if not usage:
+        return
+    metrics.incr(f'prompt_tokens.{endpoint}.requests')
+    metrics.incr(f'prompt_tokens.{endpoint}.total', usage.prompt_tokens)
+    logger.info("AI %s request sent %s prompt tokens", endpoint, usage.prompt_tokens)
+
+def get_prompt_token_stats():
+    """Requests and prompt tokens sent per endpoint"""
+    counters = metrics.get_counters(
+        [f'prompt_tokens.{endpoint}.{name}' for endpoint in PROMPT_TOKEN_ENDPOINTS for name in ('requests', 'total')]
+    )
+    stats = {}
+    for endpoint in PROMPT_TOKEN_ENDPOINTS:
+        requests = counters[f'prompt_tokens.{endpoint}.requests']
+        total = counters[f'prompt_tokens.{endpoint}.total']
+        stats[endpoint] = {
+            'requests': requests,
+            'prompt_tokens': total,
+            'avg_prompt_tokens': round(total / requests, 1) if requests else 0.0,
+        }
+    return stats
+
+def build_analysis_messages(image_data, history_context=""):
+    """Chat messages for a vision analysis of preprocessed JPEG bytes"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT + history_context},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": PHOTO_PROMPT},
+                {"type": "image_url", "image_url": {
+                    "url": f"data:image/jpeg;base64,{base64.b64encode(image_data).decode('utf-8')}",
+                    "detail": getattr(settings, 'AI_IMAGE_DETAIL', 'auto')
+                }}
+            ]
+        }
+    ]
+
+def build_text_query_messages(query, history_context=""):
+    """Chat messages for a text query"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT + history_context},
+        {"role": "user", "content": query}
+    ]
+
+def build_combined_messages(image_data, query, history_context=""):
+    """Chat messages asking for the outfit analysis and an answer to the user's query in one reply"""
+    messages = build_analysis_messages(image_data, history_context)
+    messages[1]["content"][0]["text"] = PHOTO_PROMPT + COMBINED_PROMPT.format(query=query)
+    return messages
+
+def build_combined_query(query, analysis):
+    """Text query carrying an existing outfit analysis as context"""
+    return f"Query: {query}\nBased on the outfit analysis: {json.dumps(analysis)}"
+
+def analysis_schema(required_keys=ANALYSIS_KEYS):
+    """ANALYSIS_SCHEMA, extended with string fields for any extra required keys"""
+    schema = json.loads(json.dumps(ANALYSIS_SCHEMA))
+    for key in required_keys:
+        schema["properties"].setdefault(key, {"type": "string"})
+    schema["required"] = list(required_keys)
+    return schema
+
+def analysis_request_options(required_keys=ANALYSIS_KEYS):
+    """Extra chat.completions arguments that put the model in structured-output mode"""
+    if not getattr(settings, 'AI_STRUCTURED_OUTPUT', True):
+        return {}
+    return {
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "outfit_analysis",
+                "strict": True,
+                "schema": analysis_schema(required_keys),
+            },
+        }
+    }
+
+class AnalysisParseError(ValueError):
+    """A completion that could not be turned into a valid analysis"""
+    def __init__(self, cause, message):
+        super().__init__(message)
+        self.cause = cause
+
+def extract_json_object(text):
+    """Decode the first JSON object in text, tolerating code fences and surrounding prose"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = re.sub(r'^```[a-zA-Z]*\s*|\s*```$', '', text)
+    start = text.find('{')
+    if start == -1:
+        raise AnalysisParseError("no_json", "No valid JSON found in response")
+    try:
+        result, _ = json.JSONDecoder().raw_decode(text, start)
+    except json.JSONDecodeError as e:
+        raise AnalysisParseError("invalid_json", f"Invalid JSON in response: {e}")
+    return result
+
+def validate_analysis(result, required_keys=ANALYSIS_KEYS):
+    """Check an analysis dict against analysis_schema"""
+    if not isinstance(result, dict) or not all(key in result for key in required_keys):
+        raise AnalysisParseError("missing_keys", "Invalid JSON structure")
+    
+    properties = analysis_schema(required_keys)["properties"]
+    for key in required_keys:
+        value = result[key]
+        if properties[key]["type"] == "array":
+            valid = isinstance(value, list) and all(isinstance(item, str) for item in value)
+        else:
+            valid = isinstance(value, str)
+        if not valid:
+            raise AnalysisParseError("wrong_types", f"Invalid type for '{key}'")
+    return result
+
+def parse_analysis_response(response, required_keys=ANALYSIS_KEYS):
+    """Extract and validate the analysis JSON from a completion, counting failures by cause"""
+    choice = response.choices[0]
+    try:
+        if getattr(choice.message, 'refusal', None):
+            raise AnalysisParseError("refusal", f"Model refused: {choice.message.refusal}")
+        try:
+            result = validate_analysis(extract_json_object(choice.message.content or ""), required_keys)
+        except AnalysisParseError as e:
+            # A reply cut off at max_tokens is the real cause of most broken JSON
+            if getattr(choice, 'finish_reason', None) == 'length' and e.cause in ("no_json", "invalid_json"):
+                raise AnalysisParseError("truncated", f"Response truncated: {e}")
+            raise
+    except AnalysisParseError as e:
+        metrics.incr(f'analysis_parse.failures.{e.cause}')
+        raise
+    
+    metrics.incr('analysis_parse.parsed')
+    return result
+
+def get_analysis_parse_stats():
+    """Parsed vs failed analysis completions, failures broken down by cause"""
+    counters = metrics.get_counters(
+        ['analysis_parse.parsed'] + [f'analysis_parse.failures.{cause}' for cause in PARSE_FAILURE_CAUSES]
+    )
+    failures = {cause: counters[f'analysis_parse.failures.{cause}'] for cause in PARSE_FAILURE_CAUSES}
+    failed = sum(failures.values())
+    total = counters['analysis_parse.parsed'] + failed
+    return {
+        'parsed': counters['analysis_parse.parsed'],
+        'failed': failed,
+        'failure_rate': round(failed / total, 4) if total else 0.0,
+        'failures': failures,
+    }
+
 def analyze_outfit_with_ai(image_file, session_id=None, user_id=None):
     """Analyze outfit using OpenAI GPT-4o"""
     try:
-        base64_image = encode_image(image_file)
+        image_data = preprocess_image(image_file)
+        
+        # Identical uploads under the same prompt reuse the earlier analysis
+        cache_key = analysis_cache_key(image_data, get_prompt_version())
+        cached_result = get_cached_analysis(cache_key)
+        if cached_result is not None:
+            return cached_result
         
         # Include session history if provided
-        history_context = get_session_history(session_id, user_id)
+        history_context = get_session_history(session_id, user_id, 'analysis')
         
+        started = time.monotonic()
         response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT + history_context},
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": PHOTO_PROMPT},
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
-                    ]
-                }
-            ],
-            max_tokens=300
+            model=ANALYSIS_MODEL,
+            messages=build_analysis_messages(image_data, history_context),
+            max_tokens=300,
+            **analysis_request_options()
         )
+        record_prompt_tokens('analysis', response.usage)
+        result = parse_analysis_response(response)
+        
+        latency_ms = (time.monotonic() - started) * 1000
+        total_tokens = response.usage.total_tokens if response.usage else 0
+        cache_analysis(cache_key, result, latency_ms, total_tokens)
+        
+        return result
+    except Exception as e:
+        raise ValueError(f"Analysis failed: {str(e)}")
+
+async def analyze_outfit_with_ai_async(image_file, session_id=None, user_id=None):
+    """Async analyze_outfit_with_ai: awaits the model instead of blocking a worker thread"""
+    try:
+        image_data = await sync_to_async(preprocess_image)(image_file)
         
-        # Extract JSON from response
-        response_text = response.choices[0].message.content.strip()
-        json_match = re.search(r'\{.*?\}', response_text, re.DOTALL)
+        cache_key = analysis_cache_key(image_data, get_prompt_version())
+        cached_result = await sync_to_async(get_cached_analysis)(cache_key)
+        if cached_result is not None:
+            return cached_result
         
-        if not json_match:
-            raise ValueError("No valid JSON found in response")
+        history_context = await sync_to_async(get_session_history)(session_id, user_id, 'analysis')
         
-        json_str = json_match.group(0)
-        result = json.loads(json_str)
+        started = time.monotonic()
+        response = await async_client.chat.completions.create(
+            model=ANALYSIS_MODEL,
+            messages=build_analysis_messages(image_data, history_context),
+            max_tokens=300,
+            **analysis_request_options()
+        )
+        await sync_to_async(record_prompt_tokens)('analysis', response.usage)
+        result = parse_analysis_response(response)
         
-        # Validate required keys
-        required_keys = ["title", "colors", "description", "advice", "bullet_advice"]
-        if not isinstance(result, dict) or not all(key in result for key in required_keys):
-            raise ValueError("Invalid JSON structure")
+        latency_ms = (time.monotonic() - started) * 1000
+        total_tokens = response.usage.total_tokens if response.usage else 0
+        await sync_to_async(cache_analysis)(cache_key, result, latency_ms, total_tokens)
         
         return result
     except Exception as e:
         raise ValueError(f"Analysis failed: {str(e)}")
 
+def analyze_and_answer_with_ai(image_file, query, session_id=None, user_id=None):
+    """Analyze an outfit and answer a question about it in a single GPT-4o call"""
+    try:
+        image_data = preprocess_image(image_file)
+        
+        # With the analysis already cached only the answer is left to generate
+        cache_key = analysis_cache_key(image_data, get_prompt_version())
+        cached_result = get_cached_analysis(cache_key)
+        if cached_result is not None:
+            return cached_result, handle_text_query_with_ai(build_combined_query(query, cached_result), session_id, user_id)
+        
+        history_context = get_session_history(session_id, user_id, 'combined')
+        
+        started = time.monotonic()
+        response = client.chat.completions.create(
+            model=ANALYSIS_MODEL,
+            messages=build_combined_messages(image_data, query, history_context),
+            max_tokens=450,
+            **analysis_request_options(COMBINED_KEYS)
+        )
+        record_prompt_tokens('combined', response.usage)
+        result = parse_analysis_response(response, COMBINED_KEYS)
+        answer = result.pop("answer")
+        
+        latency_ms = (time.monotonic() - started) * 1000
+        total_tokens = response.usage.total_tokens if response.usage else 0
+        cache_analysis(cache_key, result, latency_ms, total_tokens)
+        
+        return result, answer
+    except Exception as e:
+        raise ValueError(f"Analysis failed: {str(e)}")
+
+async def analyze_and_answer_with_ai_async(image_file, query, session_id=None, user_id=None):
+    """Async analyze_and_answer_with_ai"""
+    try:
+        image_data = await sync_to_async(preprocess_image)(image_file)
+        
+        cache_key = analysis_cache_key(image_data, get_prompt_version())
+        cached_result = await sync_to_async(get_cached_analysis)(cache_key)
+        if cached_result is not None:
+            answer = await handle_text_query_with_ai_async(build_combined_query(query, cached_result), session_id, user_id)
+            return cached_result, answer
+        
+        history_context = await sync_to_async(get_session_history)(session_id, user_id, 'combined')
+        
+        started = time.monotonic()
+        response = await async_client.chat.completions.create(
+            model=ANALYSIS_MODEL,
+            messages=build_combined_messages(image_data, query, history_context),
+            max_tokens=450,
+            **analysis_request_options(COMBINED_KEYS)
+        )
+        await sync_to_async(record_prompt_tokens)('combined', response.usage)
+        result = parse_analysis_response(response, COMBINED_KEYS)
+        answer = result.pop("answer")
+        
+        latency_ms = (time.monotonic() - started) * 1000
+        total_tokens = response.usage.total_tokens if response.usage else 0
+        await sync_to_async(cache_analysis)(cache_key, result, latency_ms, total_tokens)
+        
+        return result, answer
+    except Exception as e:
+        raise ValueError(f"Analysis failed: {str(e)}")
+
 def handle_text_query_with_ai(query, session_id=None, user_id=None):
     """Handle text-based queries using OpenAI"""
     try:
@@ -156,73 +554,168 @@ def handle_text_query_with_ai(query, session_id=None, user_id=None):
         
         response = client.chat.completions.create(
             model="gpt-4o",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT + history_context},
-                {"role": "user", "content": query}
-            ],
+            messages=build_text_query_messages(query, history_context),
             max_tokens=150
         )
         
+        record_prompt_tokens('text_query', response.usage)
+        
         return response.choices[0].message.content
     except Exception as e:
-        return f"Sorry, I couldn't process that. Try another question! 😊"
+        return TEXT_QUERY_FALLBACK
 
-def save_session_history(session_id, user_input, response, user_id=None, image=None, analysis_data=None):
-    """Save conversation to session history"""
+def stream_text_query_with_ai(query, session_id=None, user_id=None):
+    """Yield the answer to a text query token by token as OpenAI generates it"""
+    history_context = get_session_history(session_id, user_id)
+    
+    stream = client.chat.completions.create(
+        model="gpt-4o",
+        messages=build_text_query_messages(query, history_context),
+        max_tokens=150,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    for chunk in stream:
+        # With include_usage the final chunk carries usage and no choices
+        if getattr(chunk, 'usage', None):
+            record_prompt_tokens('text_query', chunk.usage)
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+async def handle_text_query_with_ai_async(query, session_id=None, user_id=None):
+    """Async handle_text_query_with_ai"""
     try:
-        SessionHistory.objects.create(
-            session_id=session_id,
-            user_id=str(user_id) if user_id else None,
-            user_input=user_input,
-            response=response,
-            image=image,
-            analysis_data=analysis_data
+        history_context = await sync_to_async(get_session_history)(session_id, user_id)
+        
+        response = await async_client.chat.completions.create(
+            model="gpt-4o",
+            messages=build_text_query_messages(query, history_context),
+            max_tokens=150
         )
         
-        # Keep only last 10 sessions per user/session
-        history = SessionHistory.objects.filter(session_id=session_id).order_by('-timestamp')
-        if user_id:
-            history = history.filter(user_id=str(user_id))
+        await sync_to_async(record_prompt_tokens)('text_query', response.usage)
+        
+        return response.choices[0].message.content
+    except Exception as e:
+        return TEXT_QUERY_FALLBACK
+
+def save_session_history(session_id, user_input, response, user_id=None, image=None, analysis_data=None):
+    """Save conversation to session history, keeping only the latest AI_SESSION_HISTORY_LIMIT turns"""
+    try:
+        with transaction.atomic():
+            entry = SessionHistory.objects.create(
+                session_id=session_id,
+                user_id=str(user_id) if user_id else None,
+                user_input=user_input,
+                response=response,
+                image=image,
+                analysis_data=analysis_data
+            )
+            
+            # Keep only the last turns per user/session with one set-based DELETE
+            history = SessionHistory.objects.filter(session_id=session_id)
+            if user_id:
+                history = history.filter(user_id=str(user_id))
+            
+            latest = history.order_by('-timestamp', '-id').values('pk')[:getattr(settings, 'AI_SESSION_HISTORY_LIMIT', 10)]
+            stale = history.exclude(pk__in=latest)
+            if user_id:
+                # The profile counters are the user's history rows (all turns / turns with an image),
+                # so the turns pruned here come off them again
+                pruned = stale.aggregate(turns=Count('pk'), images=Count('pk', filter=Q(image__isnull=False) & ~Q(image='')))
+                if pruned['turns']:
+                    stale.delete()
+                User.objects.filter(pk=user_id).update(
+                    conversation_count=Greatest(F('conversation_count') + 1 - pruned['turns'], 0),
+                    outfit_analysis_count=Greatest(F('outfit_analysis_count') + int(bool(entry.image)) - pruned['images'], 0),
+                )
+            else:
+                stale.delete()
+            
+            record_session_turn(entry)
         
-        if history.count() > 10:
-            old_entries = history[10:]
-            for entry in old_entries:
-                entry.delete()
+        schedule_session_summary(session_id, user_id)
                 
     except Exception as e:
         print(f"Error saving session history: {e}")
 
 def update_user_fields(user, conversation_data=None, outfit_data=None):
-    """Update user's conversation and outfits fields"""
+    """
+    Append to the user's conversation/outfit activity log (outfit_data may be a list for batches).
+    The profile counters follow the session history instead, see save_session_history.
+    """
     try:
+        now = timezone.now()
+        activities = []
         if conversation_data:
-            existing_conversations = []
-            if user.conversation:
-                try:
-                    existing_conversations = json.loads(user.conversation)
-                except (json.JSONDecodeError, TypeError):
-                    existing_conversations = []
-            
-            existing_conversations.append(conversation_data)
-            # Keep last 20 conversations
-            user.conversation = json.dumps(existing_conversations[-20:])
-        
+            activities.append(UserActivity(user=user, kind=UserActivity.KIND_CONVERSATION, data=conversation_data, created_at=now))
         if outfit_data:
-            existing_outfits = []
-            if user.outfits:
-                try:
-                    existing_outfits = json.loads(user.outfits)
-                except (json.JSONDecodeError, TypeError):
-                    existing_outfits = []
-            
-            existing_outfits.append(outfit_data)
-            # Keep last 20 outfits
-            user.outfits = json.dumps(existing_outfits[-20:])
+            for entry in outfit_data if isinstance(outfit_data, list) else [outfit_data]:
+                activities.append(UserActivity(user=user, kind=UserActivity.KIND_OUTFIT, data=entry, created_at=now))
         
-        user.save()
+        if activities:
+            # Plain INSERTs plus one UPDATE: no read-modify-write of the user row
+            UserActivity.objects.bulk_create(activities)
+            type(user).objects.filter(pk=user.pk).update(last_active=now)
     except Exception as e:
         print(f"Error updating user fields: {e}")
 
+def build_outfit_analysis(user, session_id, image_file, analysis):
+    """Unsaved OutfitAnalysis for an AI result (for create() or bulk_create())"""
+    return OutfitAnalysis(
+        user=user,
+        session_id=session_id,
+        image=image_file,
+        title=analysis['title'],
+        colors=analysis['colors'],
+        description=analysis['description'],
+        advice=analysis['advice'],
+        bullet_advice=analysis['bullet_advice']
+    )
+
+def outfit_summary(outfit_analysis):
+    """Entry appended to the user's outfit activity"""
+    return {
+        'id': outfit_analysis.id,
+        'title': outfit_analysis.title,
+        'description': outfit_analysis.description,
+        'colors': outfit_analysis.colors,
+        'timestamp': datetime.now().isoformat()
+    }
+
+def record_outfit_analysis(user, session_id, image_file, analysis):
+    """Save an OutfitAnalysis for an AI result and return it with the summary mirrored onto the user"""
+    outfit_analysis = build_outfit_analysis(user, session_id, image_file, analysis)
+    outfit_analysis.save()
+    return outfit_analysis, outfit_summary(outfit_analysis)
+
+def record_chat_turn(user, session_id, user_input, response_text, query=None, image_file=None, analysis=None):
+    """Persist one chat turn: the outfit analysis (image turns), session history and the user's activity"""
+    user_id = user.id if user else None
+    outfit_data = None
+    
+    if analysis is not None:
+        outfit_analysis, outfit_data = record_outfit_analysis(user, session_id, image_file, analysis)
+        if image_file is not None and outfit_analysis.image:
+            # Point the history turn at the stored file instead of saving the upload again
+            image_file = outfit_analysis.image.name
+    
+    save_session_history(session_id, user_input, response_text, user_id, image_file, analysis)
+    
+    if user:
+        conversation_data = None
+        if query:
+            conversation_data = {
+                'query': query,
+                'response': response_text,
+            }
+            if analysis is not None:
+                conversation_data['image_analysis'] = analysis
+            conversation_data['timestamp'] = datetime.now().isoformat()
+        update_user_fields(user, conversation_data, outfit_data)
+        # Streamed turns are saved after the stickiness middleware has returned the response
+        pin_after_write(user)
+
 # import os
 # import json
 # import base64
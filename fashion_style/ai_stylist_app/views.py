@@ -5,33 +5,105 @@ from rest_framework import permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import FormParser
 from django.contrib.auth import get_user_model
-from uuid import uuid4
+from django.http import StreamingHttpResponse
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.urls import reverse
+import logging
 import json
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-from .permissions import AdminOrReadOnly
+from .permissions import AdminOrReadOnly, IsAdminRole
+from .cache import get_analysis_cache_stats
+from .session_store import new_session_id
+from .renditions import enqueue_renditions
+from .upload_handlers import GuardedMultiPartParser, UploadRejected
+from fashion_style.celery import publish
+from fashion_style.db_routers import ReplicaReadMixin
 
-from .models import SessionHistory, OutfitAnalysis, Prompt
+from .models import SessionHistory, OutfitAnalysis, Prompt, AnalysisJob
 from .serializers import (
     OutfitAnalysisSerializer, 
-    SessionHistorySerializer, 
+    SessionHistorySerializer, SessionHistoryCompactSerializer, 
     ChatRequestSerializer,
     OutfitAnalysisRequestSerializer,
     TextQuerySerializer,
-    PromptSerializer
+    PromptSerializer,
+    AnalysisJobSerializer
 )
+from .tasks import analyze_outfit_job_task
 from .utils import (
     analyze_outfit_with_ai, 
+    analyze_and_answer_with_ai,
+    build_combined_query,
     handle_text_query_with_ai, 
-    save_session_history,
+    stream_text_query_with_ai,
     update_user_fields,
+    record_outfit_analysis,
+    build_outfit_analysis,
+    outfit_summary,
+    record_chat_turn,
+    get_analysis_parse_stats,
+    get_prompt_token_stats,
+    TEXT_QUERY_FALLBACK,
     PHOTO_PROMPT,
     SYSTEM_PROMPT
 )
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+def request_flag(request, name):
+    """True when an opt-in form/JSON flag such as stream=true is set"""
+    return str(request.data.get(name, '')).lower() in ['1', 'true', 'yes']
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_chat_response(session_id, tokens, on_complete):
+    """
+    Relay answer tokens as server-sent events.
+    Events: start (session id), token (text delta), done (full response).
+    on_complete receives the full text once the stream ends, before the done event,
+    or the text sent so far when the client disconnects mid-stream.
+    """
+    def events():
+        parts = []
+        saved = False
+        
+        def save():
+            nonlocal saved
+            saved = True
+            try:
+                on_complete(''.join(parts))
+            except Exception:
+                logger.exception(f"Error saving streamed response for session {session_id}")
+        
+        try:
+            yield sse_event('start', {'session_id': session_id})
+            try:
+                for token in tokens:
+                    parts.append(token)
+                    yield sse_event('token', {'delta': token})
+            except Exception:
+                if not parts:
+                    parts.append(TEXT_QUERY_FALLBACK)
+                    yield sse_event('token', {'delta': TEXT_QUERY_FALLBACK})
+            
+            save()
+            yield sse_event('done', {'response': ''.join(parts), 'session_id': session_id})
+        finally:
+            # Closed early (GeneratorExit when the client goes away): keep the answer it already got
+            if parts and not saved:
+                save()
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # keep nginx from buffering the stream
+    return response
 
 class OutfitAnalysisView(APIView):
     """
@@ -39,7 +111,7 @@ class OutfitAnalysisView(APIView):
     POST /api/ai/analyze-outfit/
     """
     permission_classes = [AllowAny]
-    parser_classes = [MultiPartParser, FormParser]
+    parser_classes = [GuardedMultiPartParser, FormParser]
     
     def post(self, request):
         try:
@@ -47,43 +119,153 @@ class OutfitAnalysisView(APIView):
             serializer.is_valid(raise_exception=True)
             
             image_file = serializer.validated_data['image']
-            session_id = str(uuid4())
-            user_id = request.user.id if request.user.is_authenticated else None
+            user = request.user if request.user.is_authenticated else None
+            user_id = user.id if user else None
+            session_id = new_session_id(user_id)
+            
+            # Background mode: store the upload, queue the analysis and answer right away
+            if request_flag(request, 'background'):
+                job = AnalysisJob.objects.create(user=user, session_id=session_id, image=image_file)
+                transaction.on_commit(lambda: self.enqueue_job(job))
+                # Without a broker the job already ran in-process; report where it actually stands
+                job.refresh_from_db(fields=['status'])
+                return Response({
+                    "job_id": str(job.id),
+                    "status": job.status,
+                    "status_url": request.build_absolute_uri(reverse('analysis-job', args=[job.id]))
+                }, status=status.HTTP_202_ACCEPTED)
             
             # Analyze outfit with AI
             analysis_result = analyze_outfit_with_ai(image_file, session_id, user_id)
             
             # Save outfit analysis to database
-            outfit_analysis = OutfitAnalysis.objects.create(
-                user=request.user if request.user.is_authenticated else None,
-                session_id=session_id,
-                image=image_file,
-                title=analysis_result['title'],
-                colors=analysis_result['colors'],
-                description=analysis_result['description'],
-                advice=analysis_result['advice'],
-                bullet_advice=analysis_result['bullet_advice']
-            )
+            _, outfit_data = record_outfit_analysis(user, session_id, image_file, analysis_result)
             
             # Update user's outfits field if authenticated
-            if request.user.is_authenticated:
-                outfit_data = {
-                    'id': outfit_analysis.id,
-                    'title': analysis_result['title'],
-                    'description': analysis_result['description'],
-                    'colors': analysis_result['colors'],
-                    'timestamp': datetime.now().isoformat()
-                }
-                update_user_fields(request.user, outfit_data=outfit_data)
+            if user:
+                update_user_fields(user, outfit_data=outfit_data)
             
             # Return analysis result
             return Response(analysis_result, status=status.HTTP_200_OK)
             
         except ValueError as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except UploadRejected as e:
+            return Response({"error": str(e.detail)}, status=e.status_code)
+        except Exception as e:
+            return Response({"error": "Server error occurred"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    def enqueue_job(self, job):
+        try:
+            publish(analyze_outfit_job_task, str(job.id))
+            logger.info(f"Analysis job {job.id} queued")
+        except Exception as e:
+            # No broker: publish gives up after one bounded attempt, so run the job in-process
+            # rather than leave it pending with nothing to pick it up
+            logger.error(f"Failed to queue analysis job {job.id}, running it in-process: {str(e)}")
+            analyze_outfit_job_task(str(job.id))
+
+class OutfitAnalysisBatchView(APIView):
+    """
+    Analyze several outfit images in one request
+    POST /api/ai/analyze-outfit/batch/  (multipart, repeated "images" field)
+    """
+    permission_classes = [AllowAny]
+    parser_classes = [GuardedMultiPartParser, FormParser]
+    # A non-image file becomes an error in its own result instead of failing the whole batch
+    reject_invalid_uploads = False
+    
+    @property
+    def max_upload_files(self):
+        return getattr(settings, 'AI_BATCH_MAX_IMAGES', 10)
+    
+    def post(self, request):
+        try:
+            image_files = request.FILES.getlist('images')
+            max_images = getattr(settings, 'AI_BATCH_MAX_IMAGES', 10)
+            
+            if not image_files:
+                return Response({"error": "Must provide at least one image"}, status=status.HTTP_400_BAD_REQUEST)
+            if len(image_files) > max_images:
+                return Response({"error": f"At most {max_images} images per batch"}, status=status.HTTP_400_BAD_REQUEST)
+            
+            user = request.user if request.user.is_authenticated else None
+            user_id = user.id if user else None
+            session_id = new_session_id(user_id)
+            
+            results = [{"index": index, "filename": image_file.name} for index, image_file in enumerate(image_files)]
+            
+            # Validate each upload on its own so one bad file doesn't sink the batch
+            pending = []
+            for result, image_file in zip(results, image_files):
+                serializer = OutfitAnalysisRequestSerializer(data={'image': image_file})
+                if serializer.is_valid():
+                    pending.append((result, serializer.validated_data['image']))
+                else:
+                    result.update({"status": "error", "error": serializer.errors['image'][0]})
+            
+            def analyze(item):
+                try:
+                    return analyze_outfit_with_ai(item[1], session_id, user_id), None
+                except Exception as e:
+                    return None, str(e)
+                finally:
+                    # Worker threads get their own DB connections; don't leak them
+                    connections.close_all()
+            
+            # Fan the vision calls out over a bounded pool
+            max_workers = getattr(settings, 'AI_BATCH_MAX_WORKERS', 4)
+            outfit_analyses = []
+            if pending:
+                with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as pool:
+                    outcomes = list(pool.map(analyze, pending))
+                
+                succeeded = []
+                for (result, image_file), (analysis, error) in zip(pending, outcomes):
+                    if error:
+                        result.update({"status": "error", "error": error})
+                    else:
+                        result.update({"status": "ok", "analysis": analysis})
+                        succeeded.append(result)
+                        outfit_analyses.append(build_outfit_analysis(user, session_id, image_file, analysis))
+                
+                # One INSERT for the whole batch, one write to the user's outfits
+                if outfit_analyses:
+                    outfit_analyses = OutfitAnalysis.objects.bulk_create(outfit_analyses)
+                    for result, outfit_analysis in zip(succeeded, outfit_analyses):
+                        result["id"] = outfit_analysis.id
+                        # bulk_create sends no post_save, so queue the thumbnails here
+                        enqueue_renditions('ai_stylist_app.OutfitAnalysis', outfit_analysis.id, outfit_analysis.image.name)
+                    if user:
+                        update_user_fields(user, outfit_data=[outfit_summary(oa) for oa in outfit_analyses])
+            
+            return Response({
+                "session_id": session_id,
+                "succeeded": len(outfit_analyses),
+                "failed": len(results) - len(outfit_analyses),
+                "results": results
+            }, status=status.HTTP_200_OK)
+            
+        except UploadRejected as e:
+            return Response({"error": str(e.detail)}, status=e.status_code)
         except Exception as e:
             return Response({"error": "Server error occurred"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class AnalysisJobView(generics.RetrieveAPIView):
+    """
+    Status/result of a background outfit analysis
+    GET /api/ai/analysis-jobs/<job_id>/
+    """
+    serializer_class = AnalysisJobSerializer
+    permission_classes = [AllowAny]
+    lookup_url_kwarg = 'job_id'
+    
+    def get_queryset(self):
+        # Jobs are addressed by unguessable UUIDs; signed-in users only see their own
+        if self.request.user.is_authenticated:
+            return AnalysisJob.objects.filter(Q(user=self.request.user) | Q(user__isnull=True))
+        return AnalysisJob.objects.filter(user__isnull=True)
+
 class TextQueryView(APIView):
     """
     API endpoint for text-based queries
@@ -97,23 +279,22 @@ class TextQueryView(APIView):
             serializer.is_valid(raise_exception=True)
             
             query = serializer.validated_data['query']
-            session_id = serializer.validated_data.get('session_id', str(uuid4()))
-            user_id = request.user.id if request.user.is_authenticated else None
+            user = request.user if request.user.is_authenticated else None
+            user_id = user.id if user else None
+            session_id = serializer.validated_data.get('session_id') or new_session_id(user_id)
+            
+            if request_flag(request, 'stream'):
+                return stream_chat_response(
+                    session_id,
+                    stream_text_query_with_ai(query, session_id, user_id),
+                    lambda response_text: record_chat_turn(user, session_id, query, response_text, query=query)
+                )
             
             # Handle text query with AI
             response_text = handle_text_query_with_ai(query, session_id, user_id)
             
-            # Save to session history
-            save_session_history(session_id, query, response_text, user_id)
-            
-            # Update user's conversation field if authenticated
-            if request.user.is_authenticated:
-                conversation_data = {
-                    'query': query,
-                    'response': response_text,
-                    'timestamp': datetime.now().isoformat()
-                }
-                update_user_fields(request.user, conversation_data=conversation_data)
+            # Save to session history and the user's conversation field
+            record_chat_turn(user, session_id, query, response_text, query=query)
             
             return Response({
                 "response": response_text,
@@ -129,110 +310,63 @@ class ChatView(APIView):
     POST /api/ai/chat/
     """
     permission_classes = [AllowAny]
-    parser_classes = [MultiPartParser, FormParser]
+    parser_classes = [GuardedMultiPartParser, FormParser]
     
     def post(self, request):
         try:
             # Parse form data
             query = request.data.get('query', '').strip()
             image_file = request.FILES.get('image')
-            session_id = request.data.get('session_id', str(uuid4()))
-            user_id = request.user.id if request.user.is_authenticated else None
+            user = request.user if request.user.is_authenticated else None
+            user_id = user.id if user else None
+            session_id = request.data.get('session_id') or new_session_id(user_id)
             
             # Validate inputs
             if not query and not image_file:
                 return Response({"error": "Must provide query or image"}, status=status.HTTP_400_BAD_REQUEST)
             
-            if image_file and image_file.size > 5 * 1024 * 1024:
-                return Response({"error": "Image size exceeds 5MB limit"}, status=status.HTTP_400_BAD_REQUEST)
+            stream = request_flag(request, 'stream')
             
             # Case 1: Text only
             if query and not image_file:
+                if stream:
+                    return stream_chat_response(
+                        session_id,
+                        stream_text_query_with_ai(query, session_id, user_id),
+                        lambda response_text: record_chat_turn(user, session_id, query, response_text, query=query)
+                    )
                 response_text = handle_text_query_with_ai(query, session_id, user_id)
-                user_input = query
-                
-                # Save to session history
-                save_session_history(session_id, user_input, response_text, user_id)
-                
-                # Update user conversation
-                if request.user.is_authenticated:
-                    conversation_data = {
-                        'query': query,
-                        'response': response_text,
-                        'timestamp': datetime.now().isoformat()
-                    }
-                    update_user_fields(request.user, conversation_data=conversation_data)
+                record_chat_turn(user, session_id, query, response_text, query=query)
             
             # Case 2: Text + Image
             elif query and image_file:
-                analysis = analyze_outfit_with_ai(image_file, session_id, user_id)
-                combined_query = f"Query: {query}\nBased on the outfit analysis: {json.dumps(analysis)}"
-                response_text = handle_text_query_with_ai(combined_query, session_id, user_id)
                 user_input = f"Image upload with query: {query}"
-                
-                # Save outfit analysis
-                outfit_analysis = OutfitAnalysis.objects.create(
-                    user=request.user if request.user.is_authenticated else None,
-                    session_id=session_id,
-                    image=image_file,
-                    title=analysis['title'],
-                    colors=analysis['colors'],
-                    description=analysis['description'],
-                    advice=analysis['advice'],
-                    bullet_advice=analysis['bullet_advice']
-                )
-                
-                # Save to session history
-                save_session_history(session_id, user_input, response_text, user_id, image_file, analysis)
-                
-                # Update user fields
-                if request.user.is_authenticated:
-                    conversation_data = {
-                        'query': query,
-                        'response': response_text,
-                        'image_analysis': analysis,
-                        'timestamp': datetime.now().isoformat()
-                    }
-                    outfit_data = {
-                        'id': outfit_analysis.id,
-                        'title': analysis['title'],
-                        'description': analysis['description'],
-                        'colors': analysis['colors'],
-                        'timestamp': datetime.now().isoformat()
-                    }
-                    update_user_fields(request.user, conversation_data, outfit_data)
+                if stream:
+                    # Streaming keeps the answer as its own call so tokens can flow as they are generated
+                    analysis = analyze_outfit_with_ai(image_file, session_id, user_id)
+                    return stream_chat_response(
+                        session_id,
+                        stream_text_query_with_ai(build_combined_query(query, analysis), session_id, user_id),
+                        lambda response_text: record_chat_turn(user, session_id, user_input, response_text, query=query,
+                                                               image_file=image_file, analysis=analysis)
+                    )
+                if settings.AI_COMBINED_IMAGE_QUERY:
+                    # One round trip returns both the analysis and the answer
+                    analysis, response_text = analyze_and_answer_with_ai(image_file, query, session_id, user_id)
+                else:
+                    analysis = analyze_outfit_with_ai(image_file, session_id, user_id)
+                    response_text = handle_text_query_with_ai(build_combined_query(query, analysis), session_id, user_id)
+                record_chat_turn(user, session_id, user_input, response_text, query=query,
+                                 image_file=image_file, analysis=analysis)
             
             # Case 3: Image only
             else:  # image_file and not query
                 analysis = analyze_outfit_with_ai(image_file, session_id, user_id)
                 response_text = analysis['advice']
-                user_input = "Image upload"
-                
-                # Save outfit analysis
-                outfit_analysis = OutfitAnalysis.objects.create(
-                    user=request.user if request.user.is_authenticated else None,
-                    session_id=session_id,
-                    image=image_file,
-                    title=analysis['title'],
-                    colors=analysis['colors'],
-                    description=analysis['description'],
-                    advice=analysis['advice'],
-                    bullet_advice=analysis['bullet_advice']
-                )
-                
-                # Save to session history
-                save_session_history(session_id, user_input, response_text, user_id, image_file, analysis)
-                
-                # Update user fields
-                if request.user.is_authenticated:
-                    outfit_data = {
-                        'id': outfit_analysis.id,
-                        'title': analysis['title'],
-                        'description': analysis['description'],
-                        'colors': analysis['colors'],
-                        'timestamp': datetime.now().isoformat()
-                    }
-                    update_user_fields(request.user, outfit_data=outfit_data)
+                record_chat_turn(user, session_id, "Image upload", response_text,
+                                 image_file=image_file, analysis=analysis)
+                if stream:
+                    return stream_chat_response(session_id, [response_text], lambda response_text: None)
             
             return Response({
                 "response": response_text,
@@ -241,40 +375,82 @@ class ChatView(APIView):
             
         except ValueError as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except UploadRejected as e:
+            return Response({"error": str(e.detail)}, status=e.status_code)
         except Exception as e:
             return Response({"error": "Server error occurred"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class UserOutfitHistoryView(generics.ListAPIView):
+class UserOutfitHistoryView(ReplicaReadMixin, generics.ListAPIView):
     """
     Get user's outfit analysis history
     GET /api/ai/outfit-history/
+    ?pagination=cursor pages by cursor on (created_at, id) instead of page numbers
     """
     serializer_class = OutfitAnalysisSerializer
 
-    from rest_framework.pagination import PageNumberPagination
+    from rest_framework.pagination import PageNumberPagination, CursorPagination
     class OutfitHistoryPagination(PageNumberPagination):
         page_size = 10
         page_size_query_param = 'page_size'
         max_page_size = 100
 
+    class OutfitHistoryCursorPagination(CursorPagination):
+        # Newest first; id breaks ties between analyses saved in the same instant
+        ordering = ('-created_at', '-id')
+        page_size = 10
+        page_size_query_param = 'page_size'
+        max_page_size = 100
+
     pagination_class = OutfitHistoryPagination
 
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = self.OutfitHistoryCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_queryset(self):
         if self.request.user.is_authenticated:
             return OutfitAnalysis.objects.filter(user=self.request.user)
         return OutfitAnalysis.objects.none()
 
-class UserConversationHistoryView(generics.ListAPIView):
+class UserConversationHistoryView(ReplicaReadMixin, generics.ListAPIView):
     """
-    Get user's conversation history
+    Get user's conversation history, newest first, paged by cursor
     GET /api/ai/conversation-history/
+    ?session_id=<id> limits it to one session; ?compact=true drops analysis_data_display
     """
     serializer_class = SessionHistorySerializer
     
+    from rest_framework.pagination import CursorPagination
+    class ConversationHistoryPagination(CursorPagination):
+        # Newest first; id breaks ties between turns saved in the same instant
+        ordering = ('-timestamp', '-id')
+        page_size = 20
+        page_size_query_param = 'page_size'
+        max_page_size = 100
+
+    pagination_class = ConversationHistoryPagination
+    
+    def is_compact(self):
+        return self.request.query_params.get('compact', '').lower() in ('true', '1')
+    
+    def get_serializer_class(self):
+        if self.is_compact():
+            return SessionHistoryCompactSerializer
+        return SessionHistorySerializer
+    
     def get_queryset(self):
-        if self.request.user.is_authenticated:
-            return SessionHistory.objects.filter(user_id=str(self.request.user.id))
-        return SessionHistory.objects.none()
+        if not self.request.user.is_authenticated:
+            return SessionHistory.objects.none()
+        history = SessionHistory.objects.filter(user_id=str(self.request.user.id))
+        session_id = self.request.query_params.get('session_id')
+        if session_id:
+            history = history.filter(session_id=session_id)
+        return history
 
 class OutfitAnalysisDetailView(generics.RetrieveAPIView):
     """
@@ -287,6 +463,21 @@ class OutfitAnalysisDetailView(generics.RetrieveAPIView):
         if self.request.user.is_authenticated:
             return OutfitAnalysis.objects.filter(user=self.request.user)
         return OutfitAnalysis.objects.none()
+
+class AIMetricsView(APIView):
+    """
+    AI usage counters for admins
+    GET /api/ai/metrics/
+    """
+    permission_classes = [IsAdminRole]
+    
+    def get(self, request):
+        return Response({
+            "analysis_cache": get_analysis_cache_stats(),
+            "analysis_parse": get_analysis_parse_stats(),
+            "prompt_tokens": get_prompt_token_stats()
+        }, status=status.HTTP_200_OK)
+
 # from django.shortcuts import render
 
 # # Create your views here.
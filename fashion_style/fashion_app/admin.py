@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, OTP
+from .models import User, OTP, UserActivity, DailyUserStats
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('email', 'first_name', 'last_name', 'role', 'is_verified', 'is_disabled', 'date_created')
@@ -14,6 +14,21 @@ class CustomUserAdmin(UserAdmin):
                       'conversation', 'outfits', 'is_anonymous')
         }),
     )
+    # Read-only views over the latest UserActivity entries
+    readonly_fields = ('conversation', 'outfits')
+
+class UserActivityAdmin(admin.ModelAdmin):
+    list_display = ('user', 'kind', 'created_at')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('user__email',)
+    raw_id_fields = ('user',)
+    ordering = ('-created_at',)
+
+class DailyUserStatsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'new_users', 'anonymous_users', 'updated_at')
+    date_hierarchy = 'date'
 
 admin.site.register(User, CustomUserAdmin)
-admin.site.register(OTP)
\ No newline at end of file
+admin.site.register(OTP)
+admin.site.register(UserActivity, UserActivityAdmin)
+admin.site.register(DailyUserStats, DailyUserStatsAdmin)
\ No newline at end of file
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class FashionAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fashion_app'
+    
+    def ready(self):
+        from django.core import checks
+        from fashion_style.db_routers import check_primary_pin_cache
+        
+        checks.register(check_primary_pin_cache, checks.Tags.caches, checks.Tags.database)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from fashion_app.utils import reconcile_user_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute users' conversation_count and outfit_analysis_count from their source tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Users updated per UPDATE statement")
+
+    def handle(self, *args, **options):
+        corrected = reconcile_user_counters(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Corrected counters of {corrected} users"))
@@ -0,0 +1,74 @@
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+BATCH_SIZE = 500
+RECENT_LIMIT = 20
+
+
+def parse_entries(raw):
+    try:
+        entries = json.loads(raw) if raw else []
+    except (json.JSONDecodeError, TypeError):
+        return []
+    return [entry for entry in entries if isinstance(entry, dict)] if isinstance(entries, list) else []
+
+
+def entry_time(entry, fallback):
+    try:
+        created_at = datetime.fromisoformat(entry['timestamp'])
+    except (KeyError, TypeError, ValueError):
+        return fallback
+    if settings.USE_TZ and timezone.is_naive(created_at):
+        created_at = timezone.make_aware(created_at)
+    return created_at
+
+
+def copy_blobs_to_activity(apps, schema_editor):
+    User = apps.get_model('fashion_app', 'User')
+    UserActivity = apps.get_model('fashion_app', 'UserActivity')
+
+    activities = []
+    users = User.objects.exclude(conversation='', outfits='').only('id', 'conversation', 'outfits', 'last_active')
+    for user in users.iterator(chunk_size=BATCH_SIZE):
+        fallback = user.last_active or timezone.now()
+        for kind, raw in (('conversation', user.conversation), ('outfit', user.outfits)):
+            entries = parse_entries(raw)
+            for position, entry in enumerate(entries):
+                # Entries without a usable timestamp keep their order just before last_active
+                created_at = entry_time(entry, fallback - timedelta(microseconds=len(entries) - position))
+                activities.append(UserActivity(user_id=user.id, kind=kind, data=entry, created_at=created_at))
+
+        if len(activities) >= BATCH_SIZE:
+            UserActivity.objects.bulk_create(activities)
+            activities = []
+
+    if activities:
+        UserActivity.objects.bulk_create(activities)
+
+
+def copy_activity_to_blobs(apps, schema_editor):
+    User = apps.get_model('fashion_app', 'User')
+    UserActivity = apps.get_model('fashion_app', 'UserActivity')
+
+    for user_id in UserActivity.objects.values_list('user_id', flat=True).distinct():
+        fields = {}
+        for kind, field in (('conversation', 'conversation'), ('outfit', 'outfits')):
+            latest = UserActivity.objects.filter(user_id=user_id, kind=kind).order_by('-created_at', '-id')
+            entries = [activity.data for activity in reversed(list(latest[:RECENT_LIMIT]))]
+            fields[field] = json.dumps(entries) if entries else ''
+        User.objects.filter(pk=user_id).update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fashion_app', '0003_useractivity'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_blobs_to_activity, copy_activity_to_blobs),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:47
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fashion_app', '0004_copy_user_activity'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='conversation',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='outfits',
+        ),
+    ]
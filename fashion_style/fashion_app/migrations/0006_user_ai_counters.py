@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:49
+
+from django.db import migrations, models
+from django.db.models import CharField, Count, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    User = apps.get_model('fashion_app', 'User')
+    SessionHistory = apps.get_model('ai_stylist_app', 'SessionHistory')
+
+    # The counts the profile ran live before: the user's SessionHistory rows
+    # (User.get_conversation_history, user_id is a CharField) and those of them with an
+    # image (User.get_outfit_analyses). Turns without an image store '' rather than NULL,
+    # so image__isnull=False alone matched every turn. save_session_history keeps both
+    # up to date from here.
+    history = SessionHistory.objects.filter(user_id=Cast(OuterRef('pk'), CharField())).order_by().values('user_id')
+    conversations = history.annotate(total=Count('pk')).values('total')
+    outfits = history.filter(image__isnull=False).exclude(image='').annotate(total=Count('pk')).values('total')
+
+    User.objects.update(
+        conversation_count=Coalesce(Subquery(conversations), 0),
+        outfit_analysis_count=Coalesce(Subquery(outfits), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fashion_app', '0005_remove_user_conversation_outfits'),
+        ('ai_stylist_app', '0006_session_history_and_outfit_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='conversation_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='outfit_analysis_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
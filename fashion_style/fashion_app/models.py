@@ -1,7 +1,10 @@
 # models.py
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
 from django.utils import timezone
+import json
 import random
 import string
 
@@ -46,13 +49,26 @@ class User(AbstractUser):
     last_active = models.DateTimeField(auto_now=True)
     role = models.CharField(max_length=20, choices=USER_ROLES, default='user')
     profile_image = models.ImageField(upload_to='profile_images/', blank=True, null=True)
-    conversation = models.TextField(blank=True)
-    outfits = models.TextField(blank=True)
+    profile_image_renditions = models.JSONField(default=dict, blank=True)  # Thumbnail names, see ai_stylist_app.renditions
     is_disabled = models.BooleanField(default=False)
+    # get_conversation_history() / get_outfit_analyses() counts, maintained by
+    # ai_stylist_app.utils.save_session_history and corrected by reconcile_user_counters
+    conversation_count = models.PositiveIntegerField(default=0)
+    outfit_analysis_count = models.PositiveIntegerField(default=0)
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['phone_number']
     
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Admin user list: role filter, newest first, keyset on (date_created, id)
+            models.Index(fields=['role', '-date_created', '-id'], name='user_role_created'),
+            # Dashboard sign-up counts: a date_created range covering one or two days
+            models.Index(fields=['date_created'], name='user_date_created'),
+            # Media ownership checks and reference counting look users up by profile image
+            models.Index(fields=['profile_image'], name='user_profile_image'),
+        ]
+    
     
     objects = UserManager()  # Use the custom manager
 
@@ -72,10 +88,95 @@ class User(AbstractUser):
     def get_outfit_analyses(self):
             """Get user's outfit analysis history"""
             from ai_stylist_app.models import SessionHistory
+            # Turns saved without an image store '' rather than NULL
             return SessionHistory.objects.filter(
                 user_id=str(self.id), 
                 image__isnull=False
-            ).order_by('timestamp')
+            ).exclude(image='').order_by('timestamp')
+
+    def load_recent_activity(self):
+        """
+        Fetch the latest activity of every kind with one ranked query and keep it on the instance,
+        where prefetch_recent_activity puts it; a profile then costs one query for both properties
+        """
+        ranked = self.activities.annotate(
+            rank=Window(RowNumber(), partition_by=F('kind'), order_by=[F('created_at').desc(), F('id').desc()])
+        ).filter(rank__lte=UserActivity.RECENT_LIMIT).order_by('-created_at', '-id')
+        by_kind = {kind: [] for kind, _ in UserActivity.KINDS}
+        for activity in ranked:
+            by_kind[activity.kind].append(activity)
+        for kind, activities in by_kind.items():
+            setattr(self, f'recent_{kind}_activity', activities)
+
+    def get_recent_activity(self, kind):
+        """
+        Latest UserActivity payloads of a kind, oldest first. Loaded once per instance (or by
+        prefetch_recent_activity), so activity logged afterwards shows up on a fresh instance
+        """
+        if getattr(self, f'recent_{kind}_activity', None) is None:
+            self.load_recent_activity()
+        return [activity.data for activity in reversed(getattr(self, f'recent_{kind}_activity'))]
+
+    @property
+    def conversation(self):
+        """Last conversations as the JSON string the former conversation field held"""
+        entries = self.get_recent_activity(UserActivity.KIND_CONVERSATION)
+        return json.dumps(entries) if entries else ''
+
+    @property
+    def outfits(self):
+        """Last outfit analyses as the JSON string the former outfits field held"""
+        entries = self.get_recent_activity(UserActivity.KIND_OUTFIT)
+        return json.dumps(entries) if entries else ''
+
+class UserActivity(models.Model):
+    """Append-only log of a user's AI conversations and outfit analyses"""
+    KIND_CONVERSATION = 'conversation'
+    KIND_OUTFIT = 'outfit'
+    KINDS = [
+        (KIND_CONVERSATION, 'Conversation'),
+        (KIND_OUTFIT, 'Outfit'),
+    ]
+    RECENT_LIMIT = 20  # entries exposed through User.conversation / User.outfits
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activities')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    data = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'kind', '-created_at'], name='useractivity_user_kind_created'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.kind} - {self.created_at}"
+
+def prefetch_recent_activity(queryset):
+    """Load the recent activity behind User.conversation / User.outfits for a whole user queryset in two queries"""
+    return queryset.prefetch_related(*[
+        Prefetch(
+            'activities',
+            queryset=UserActivity.objects.filter(kind=kind).order_by('-created_at', '-id')[:UserActivity.RECENT_LIMIT],
+            to_attr=f'recent_{kind}_activity'
+        )
+        for kind, _ in UserActivity.KINDS
+    ])
+
+class DailyUserStats(models.Model):
+    """Sign-ups of one finished day, rolled up by fashion_app.tasks.rollup_daily_user_stats_task"""
+    date = models.DateField(unique=True)
+    new_users = models.PositiveIntegerField(default=0)
+    anonymous_users = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date']
+        verbose_name_plural = 'Daily user stats'
+    
+    def __str__(self):
+        return f"{self.date} - {self.new_users} new, {self.anonymous_users} anonymous"
 
 class OTP(models.Model):
     OTP_TYPES = [
@@ -3,6 +3,7 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from .models import User, OTP
 from .utils import send_otp_email
+from ai_stylist_app.renditions import rendition_urls
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, validators=[validate_password])
@@ -85,21 +86,19 @@ class UserLoginSerializer(serializers.Serializer):
 
 class UserProfileSerializer(serializers.ModelSerializer):
     full_name = serializers.ReadOnlyField()
-    conversation_count = serializers.SerializerMethodField() # AI
-    outfit_analysis_count = serializers.SerializerMethodField() # AI
+    profile_image_renditions = serializers.SerializerMethodField()
     
     class Meta:
         model = User
         fields = ['id', 'email', 'phone_number', 'first_name', 'last_name', 
-                 'full_name', 'profile_image', 'date_created', 'last_active', 
+                 'full_name', 'profile_image', 'profile_image_renditions', 'date_created', 'last_active', 
                  'is_anonymous', 'conversation', 'outfits','conversation_count', 
                  'outfit_analysis_count']
-    # AI
-    def get_conversation_count(self, obj):
-        return obj.get_conversation_history().count()
+        # AI counters are maintained on the user row
+        read_only_fields = ['conversation_count', 'outfit_analysis_count']
     
-    def get_outfit_analysis_count(self, obj):
-        return obj.get_outfit_analyses().count()    
+    def get_profile_image_renditions(self, obj):
+        return rendition_urls(obj.profile_image, obj.profile_image_renditions, self.context.get('request'))
     
 class UserProfileUpdateSerializer(serializers.ModelSerializer):
     full_name = serializers.CharField(write_only=True, required=False)
@@ -240,6 +239,15 @@ class UserManagementSerializer(serializers.ModelSerializer):
         fields = ['id', 'full_name', 'email', 'phone_number', 'is_anonymous', 
                  'date_created', 'last_active', 'conversation', 'outfits', 'is_disabled']
 
+class UserManagementLeanSerializer(serializers.ModelSerializer):
+    """Admin user list row without the conversation/outfits entries (see the user detail endpoint)"""
+    full_name = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = User
+        fields = ['id', 'full_name', 'email', 'phone_number', 'is_anonymous', 
+                 'date_created', 'last_active', 'is_disabled', 'conversation_count', 'outfit_analysis_count']
+
 class AdminSerializer(serializers.ModelSerializer):
     has_access_to = serializers.CharField(source='role')
     contract = serializers.CharField(source='phone_number')
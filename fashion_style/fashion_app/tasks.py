@@ -141,4 +141,26 @@ def example_task():
     Example task for testing Celery functionality
     """
     print("This is an example task running in the background.")
-    return "Example task completed successfully"
\ No newline at end of file
+    return "Example task completed successfully"
+
+@shared_task
+def reconcile_user_counters_task():
+    """
+    Celery beat task to correct drift in the denormalized per-user AI counters
+    """
+    from .utils import reconcile_user_counters
+    return reconcile_user_counters()
+
+@shared_task
+def rollup_daily_user_stats_task(days=2):
+    """
+    Celery beat task to store the sign-up counts of the last finished days in DailyUserStats
+    """
+    from django.utils import timezone
+    from datetime import timedelta
+    from .utils import rollup_daily_user_stats
+    
+    today = timezone.localdate()
+    rows = rollup_daily_user_stats([today - timedelta(days=offset) for offset in range(1, days + 1)])
+    logger.info(f"Rolled up daily user stats for {len(rows)} days")
+    return len(rows)
@@ -1,3 +1,167 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
 
-# Create your tests here.
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ai_stylist_app.models import SessionHistory
+
+from .models import User, UserActivity, prefetch_recent_activity
+from .utils import reconcile_user_counters
+
+
+class RecentActivityTests(TestCase):
+    """User.conversation / User.outfits replay the latest UserActivity rows as the old JSON fields did"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('activity@example.com', '+15550001001', 'pw12345!x', is_verified=True)
+        now = timezone.now()
+        UserActivity.objects.bulk_create(
+            [
+                UserActivity(user=self.user, kind=UserActivity.KIND_CONVERSATION, data={'query': f"q{index}"},
+                             created_at=now - timedelta(minutes=30 - index))
+                for index in range(UserActivity.RECENT_LIMIT + 5)
+            ] + [
+                UserActivity(user=self.user, kind=UserActivity.KIND_OUTFIT, data={'title': "Sage Glam"}, created_at=now)
+            ]
+        )
+
+    def test_properties_return_the_latest_entries_oldest_first(self):
+        user = User.objects.get(pk=self.user.pk)
+        conversation = json.loads(user.conversation)
+        self.assertEqual([entry['query'] for entry in conversation], [f"q{index}" for index in range(5, 25)])
+        self.assertEqual(json.loads(user.outfits), [{'title': "Sage Glam"}])
+
+    def test_empty_log_reads_as_an_empty_field(self):
+        user = User.objects.create_user('quiet@example.com', '+15550001002', 'pw12345!x')
+        self.assertEqual((user.conversation, user.outfits), ('', ''))
+
+    def test_both_properties_cost_one_query(self):
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            user.conversation
+            user.outfits
+
+    def test_prefetched_users_cost_no_further_queries(self):
+        users = list(prefetch_recent_activity(User.objects.filter(pk=self.user.pk)))
+        with self.assertNumQueries(0):
+            self.assertEqual(len(json.loads(users[0].conversation)), UserActivity.RECENT_LIMIT)
+            users[0].outfits
+
+    def test_profile_loads_the_activity_once(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertNumQueries(1):  # force_authenticate skips the user lookup: only the activity query remains
+            response = client.get('/api/profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.data['conversation'])), UserActivity.RECENT_LIMIT)
+
+
+class ReconcileUserCountersTests(TestCase):
+    """reconcile_user_counters resets drifted counters to the user's history rows, up or down"""
+
+    def add_turns(self, user, turns, images=0):
+        SessionHistory.objects.bulk_create([
+            SessionHistory(session_id='reconciled', user_id=str(user.pk), user_input="Shoes?", response="Loafers",
+                           image=f"outfit_images/{index}.jpg" if index < images else None)
+            for index in range(turns)
+        ])
+
+    def test_drift_is_corrected_in_both_directions(self):
+        high = User.objects.create_user('high@example.com', '+15550001005', 'pw12345!x')
+        low = User.objects.create_user('low@example.com', '+15550001006', 'pw12345!x')
+        exact = User.objects.create_user('exact@example.com', '+15550001007', 'pw12345!x')
+        self.add_turns(high, 3, images=1)
+        self.add_turns(low, 6, images=4)
+        self.add_turns(exact, 2)
+        User.objects.filter(pk=high.pk).update(conversation_count=40, outfit_analysis_count=9)
+        User.objects.filter(pk=low.pk).update(conversation_count=1, outfit_analysis_count=0)
+        User.objects.filter(pk=exact.pk).update(conversation_count=2, outfit_analysis_count=0)
+
+        self.assertEqual(reconcile_user_counters(batch_size=1), 2)
+
+        counters = {pk: (conversations, outfits) for pk, conversations, outfits in
+                    User.objects.values_list('pk', 'conversation_count', 'outfit_analysis_count')}
+        self.assertEqual(counters, {high.pk: (3, 1), low.pk: (6, 4), exact.pk: (2, 0)})
+        self.assertEqual(reconcile_user_counters(), 0)
+
+
+class MigrationTestMixin:
+    """Migrate back to `before` for the test to seed old rows, forward to `after` in migrate(), and to the latest state afterwards"""
+
+    before = after = None
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.addCleanup(self.migrate_to_latest)
+        executor.migrate(self.before)
+        self.old_apps = executor.loader.project_state(self.before).apps
+
+    def migrate_to_latest(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        return executor.loader.project_state(self.after).apps
+
+
+class CopyUserActivityMigrationTests(MigrationTestMixin, TransactionTestCase):
+    """0004_copy_user_activity moves the conversation/outfits JSON blobs into UserActivity rows"""
+
+    before = [('fashion_app', '0003_useractivity')]
+    after = [('fashion_app', '0004_copy_user_activity')]
+
+    def test_blobs_become_activity_rows(self):
+        User = self.old_apps.get_model('fashion_app', 'User')
+        user = User.objects.create(
+            email='legacy@example.com', phone_number='+15550001003',
+            conversation=json.dumps([
+                {'query': "first", 'timestamp': '2026-01-01T10:00:00+00:00'},
+                {'query': "undated"},
+                "not an entry",
+            ]),
+            outfits=json.dumps([{'title': "Sage Glam", 'timestamp': '2026-01-02T10:00:00+00:00'}]),
+        )
+        last_active = User.objects.get(pk=user.pk).last_active
+        User.objects.create(email='broken@example.com', phone_number='+15550001004', conversation='{not json', outfits='')
+
+        UserActivity = self.migrate().get_model('fashion_app', 'UserActivity')
+
+        activities = list(UserActivity.objects.order_by('kind', 'created_at').values_list('user_id', 'kind', 'data', 'created_at'))
+        self.assertEqual([(user_id, kind, data) for user_id, kind, data, _ in activities], [
+            (user.pk, 'conversation', {'query': "first", 'timestamp': '2026-01-01T10:00:00+00:00'}),
+            (user.pk, 'conversation', {'query': "undated"}),
+            (user.pk, 'outfit', {'title': "Sage Glam", 'timestamp': '2026-01-02T10:00:00+00:00'}),
+        ])
+        # Entries without a timestamp are placed just before last_active
+        self.assertLess(activities[1][3], last_active)
+        self.assertGreater(activities[1][3], last_active - timedelta(seconds=1))
+
+
+class BackfillCountersMigrationTests(MigrationTestMixin, TransactionTestCase):
+    """0006_user_ai_counters starts the counters at the history counts the profile showed before"""
+
+    before = [('fashion_app', '0005_remove_user_conversation_outfits'), ('ai_stylist_app', '0006_session_history_and_outfit_indexes')]
+    after = [('fashion_app', '0006_user_ai_counters')]
+
+    def test_counters_start_at_the_history_counts(self):
+        User = self.old_apps.get_model('fashion_app', 'User')
+        SessionHistory = self.old_apps.get_model('ai_stylist_app', 'SessionHistory')
+        user = User.objects.create(email='history@example.com', phone_number='+15550001008')
+        quiet = User.objects.create(email='silent@example.com', phone_number='+15550001009')
+        SessionHistory.objects.bulk_create([
+            SessionHistory(session_id='backfill', user_id=str(user.pk), user_input="Image upload", response="",
+                           image=image)
+            for image in ('outfit_images/a.jpg', 'outfit_images/b.jpg', '', '')
+        ] + [SessionHistory(session_id='anonymous', user_input="Shoes?", response="")])
+
+        User = self.migrate().get_model('fashion_app', 'User')
+
+        counters = {pk: (conversations, outfits) for pk, conversations, outfits in
+                    User.objects.values_list('pk', 'conversation_count', 'outfit_analysis_count')}
+        self.assertEqual(counters, {user.pk: (4, 2), quiet.pk: (0, 0)})
@@ -24,6 +24,7 @@ urlpatterns = [
     # Admin URLs
     path('admin/dashboard/', views.DashboardView.as_view(), name='admin_dashboard'),
     path('admin/users/', views.UserManagementView.as_view(), name='user_management'),
+    path('admin/users/<int:user_id>/', views.UserDetailView.as_view(), name='user_detail'),
     path('admin/users/<int:user_id>/action/', views.UserActionView.as_view(), name='user_action'),
     path('admin/administrators/', views.AdministratorsView.as_view(), name='administrators'),
     path('admin/administrators/create/', views.AdminCreateView.as_view(), name='admin_create'),
@@ -1,5 +1,10 @@
 from django.core.mail import send_mail
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+from datetime import datetime, time, timedelta
 from .tasks import send_otp_email_task
 import logging
 
@@ -69,6 +74,121 @@ def send_otp_email_sync(email, otp_code, otp_type='registration'):
     except Exception as e:
         logger.error(f"Failed to send OTP email synchronously to {email}: {str(e)}")
         return False
+def reconcile_user_counters(batch_size=1000):
+    """
+    Reset User.conversation_count / outfit_analysis_count to the user's SessionHistory rows and
+    those of them with an image, correcting drift either way. Returns the number of users corrected.
+    """
+    from ai_stylist_app.models import SessionHistory
+    from .models import User
+    
+    def count_of(queryset):
+        return Coalesce(Subquery(
+            queryset.filter(user_id=Cast(OuterRef('pk'), CharField())).order_by().values('user_id')
+            .annotate(total=Count('pk')).values('total')
+        ), 0)
+    
+    turns = SessionHistory.objects.all()
+    image_turns = SessionHistory.objects.filter(image__isnull=False).exclude(image='')
+    drifted = User.objects.annotate(
+        actual_conversations=count_of(turns),
+        actual_outfits=count_of(image_turns),
+    ).filter(
+        ~Q(conversation_count=F('actual_conversations')) | ~Q(outfit_analysis_count=F('actual_outfits'))
+    ).order_by('pk').values_list('pk', flat=True)
+    
+    corrected = 0
+    ids = list(drifted[:batch_size])
+    while ids:
+        # Counted inside the UPDATE so turns saved meanwhile are not overwritten
+        corrected += User.objects.filter(pk__in=ids).update(
+            conversation_count=count_of(turns),
+            outfit_analysis_count=count_of(image_turns),
+        )
+        ids = list(drifted.filter(pk__gt=ids[-1])[:batch_size])
+    
+    if corrected:
+        logger.warning(f"Reconciled AI counters of {corrected} users")
+    return corrected
+
+DASHBOARD_CACHE_KEY = 'dashboard:user_stats'
+
+def day_start(day):
+    """Aware datetime at which a local calendar day begins"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+def count_signups(days):
+    """
+    New and anonymous sign-ups of each given day, from one conditional-aggregate query
+    over the date_created range the days span: {day: {'new_users', 'anonymous_users'}}
+    """
+    from .models import User
+    
+    if not days:
+        return {}
+    
+    aggregates = {}
+    for day in days:
+        in_day = Q(date_created__gte=day_start(day), date_created__lt=day_start(day + timedelta(days=1)))
+        aggregates[f'new_{day:%Y%m%d}'] = Count('pk', filter=in_day & Q(role='user'))
+        aggregates[f'anonymous_{day:%Y%m%d}'] = Count('pk', filter=in_day & Q(is_anonymous=True))
+    
+    counts = User.objects.filter(
+        date_created__gte=day_start(min(days)),
+        date_created__lt=day_start(max(days) + timedelta(days=1)),
+    ).aggregate(**aggregates)
+    
+    return {
+        day: {
+            'new_users': counts[f'new_{day:%Y%m%d}'],
+            'anonymous_users': counts[f'anonymous_{day:%Y%m%d}'],
+        }
+        for day in days
+    }
+
+def rollup_daily_user_stats(days):
+    """Store the sign-up counts of finished days in DailyUserStats; returns the rows written"""
+    from .models import DailyUserStats
+    
+    today = timezone.localdate()
+    days = [day for day in days if day < today]  # today is still changing
+    rows = []
+    for day, counts in count_signups(days).items():
+        row, _ = DailyUserStats.objects.update_or_create(date=day, defaults=counts)
+        rows.append(row)
+    return rows
+
+def get_dashboard_user_stats():
+    """
+    Counts behind the admin dashboard, cached for DASHBOARD_CACHE_TTL seconds.
+    Yesterday comes from the DailyUserStats rollup; only today (and yesterday,
+    when the rollup has not run yet) is counted live.
+    """
+    from .models import DailyUserStats, User
+    
+    today = timezone.localdate()
+    yesterday = today - timedelta(days=1)
+    # Keyed by day so a cached "today" never outlives midnight
+    cache_key = f"{DASHBOARD_CACHE_KEY}:{today}"
+    stats = cache.get(cache_key)
+    if stats is not None:
+        return stats
+    
+    
+    rolled_up = DailyUserStats.objects.filter(date=yesterday).values('new_users', 'anonymous_users').first()
+    live = count_signups([today] if rolled_up else [yesterday, today])
+    if not rolled_up:
+        rolled_up = live[yesterday]
+        DailyUserStats.objects.update_or_create(date=yesterday, defaults=rolled_up)
+    
+    stats = {
+        'total_users': User.objects.filter(role='user').count(),
+        'today': live[today],
+        'yesterday': rolled_up,
+    }
+    cache.set(cache_key, stats, getattr(settings, 'DASHBOARD_CACHE_TTL', 60))
+    return stats
+
 # from django.core.mail import send_mail
 # from django.conf import settings
 
@@ -7,9 +7,10 @@ from django.utils import timezone
 from datetime import timedelta
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken, TokenError
-from .models import User, OTP
+from .models import User, OTP, prefetch_recent_activity
 from .serializers import *
-from .utils import send_otp_email
+from .utils import send_otp_email, get_dashboard_user_stats
+from fashion_style.db_routers import ReplicaReadMixin
 from rest_framework.permissions import AllowAny  # Change this based on your security needs
 from django.contrib.auth import get_user_model
 from .tasks import (
@@ -296,17 +297,13 @@ class DashboardView(APIView):
         if request.user.role not in ['Stap_admin', 'superadmin']:
             return Response({'error': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
         
-        today = timezone.now().date()
-        yesterday = today - timedelta(days=1)
-        
-        # Today's data
-        total_users = User.objects.filter(role='user').count()
-        new_users_today = User.objects.filter(role='user', date_created__date=today).count()
-        anonymous_users_today = User.objects.filter(is_anonymous=True, date_created__date=today).count()
-        
-        # Yesterday's data
-        new_users_yesterday = User.objects.filter(role='user', date_created__date=yesterday).count()
-        anonymous_users_yesterday = User.objects.filter(is_anonymous=True, date_created__date=yesterday).count()
+        # One conditional-aggregate query for today's sign-ups; yesterday's come from the daily rollup
+        stats = get_dashboard_user_stats()
+        total_users = stats['total_users']
+        new_users_today = stats['today']['new_users']
+        anonymous_users_today = stats['today']['anonymous_users']
+        new_users_yesterday = stats['yesterday']['new_users']
+        anonymous_users_yesterday = stats['yesterday']['anonymous_users']
         
         # Calculate percentages
         def calculate_percentage(today_count, yesterday_count):
@@ -367,23 +364,71 @@ class DashboardView(APIView):
 #         serializer = DashboardSerializer(data)
 #         return Response(serializer.data, status=status.HTTP_200_OK)
 
-class UserManagementView(generics.ListAPIView):
+class UserManagementView(ReplicaReadMixin, generics.ListAPIView):
+    """
+    Admin user list
+    GET /api/admin/users/
+    ?mode=lean drops conversation/outfits and pages by cursor on (date_created, id),
+    so deep pages cost the same as the first one
+    """
     serializer_class = UserManagementSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    def is_lean(self):
+        return self.request.query_params.get('mode') == 'lean'
+    
+    def get_serializer_class(self):
+        if self.is_lean():
+            return UserManagementLeanSerializer
+        return UserManagementSerializer
+    
     def get_queryset(self):
         if self.request.user.role not in ['Stap_admin', 'superadmin']:
             return User.objects.none()
-        return User.objects.filter(role='user')
+        if self.is_lean():
+            return User.objects.filter(role='user').only(*UserManagementView.LEAN_FIELDS)
+        # conversation/outfits come from UserActivity; load them for the whole page at once
+        return prefetch_recent_activity(User.objects.filter(role='user'))
 
-    from rest_framework.pagination import PageNumberPagination
+    LEAN_FIELDS = ['id', 'first_name', 'last_name', 'email', 'phone_number', 'is_anonymous', 
+                   'date_created', 'last_active', 'is_disabled', 'conversation_count', 'outfit_analysis_count']
+
+    from rest_framework.pagination import PageNumberPagination, CursorPagination
     class UserPagination(PageNumberPagination):
         page_size = 10
         page_size_query_param = 'page_size'
         max_page_size = 100
 
+    class UserCursorPagination(CursorPagination):
+        # Newest first; id breaks ties between users created in the same instant
+        ordering = ('-date_created', '-id')
+        page_size = 10
+        page_size_query_param = 'page_size'
+        max_page_size = 100
+
     pagination_class = UserPagination
     
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = self.UserCursorPagination() if self.is_lean() else self.pagination_class()
+        return self._paginator
+    
+
+class UserDetailView(generics.RetrieveAPIView):
+    """
+    Admin view of one user including conversation and outfits
+    GET /api/admin/users/<user_id>/
+    """
+    serializer_class = UserManagementSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_url_kwarg = 'user_id'
+    
+    def get_queryset(self):
+        if self.request.user.role not in ['Stap_admin', 'superadmin']:
+            return User.objects.none()
+        return User.objects.filter(role='user')
+    
 
 class UserActionView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -437,7 +482,7 @@ class UserActionView(APIView):
 #         else:
 #             return Response({'error': 'Invalid action.'}, status=status.HTTP_400_BAD_REQUEST)
 
-class AdministratorsView(generics.ListAPIView):
+class AdministratorsView(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = AdminSerializer
     permission_classes = [permissions.IsAuthenticated]
     
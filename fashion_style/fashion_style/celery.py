@@ -6,3 +6,15 @@ app = Celery('fashion_style',)
 app.config_from_object('django.conf:settings', namespace='CELERY')
 #app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 app.autodiscover_tasks()
+
+
+def publish(task, *args, **kwargs):
+    """
+    Queue a task from inside a request without waiting on an unreachable broker:
+    one connection attempt bounded by CELERY_PUBLISH_CONNECT_TIMEOUT, no publish
+    retries and no result-backend subscription (callers never read the result).
+    Raises the broker's error so the caller can fall back.
+    """
+    timeout = getattr(settings, 'CELERY_PUBLISH_CONNECT_TIMEOUT', 1)
+    with app.connection_for_write(connect_timeout=timeout, transport_options={'max_retries': 0}) as connection:
+        return task.apply_async(args, kwargs, connection=connection, retry=False, ignore_result=True)
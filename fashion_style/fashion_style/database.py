@@ -0,0 +1,93 @@
+"""
+Database configuration read from the environment.
+
+DB_ENGINE selects the backend ('sqlite' by default, or 'postgresql'). Connections
+are kept open for DB_CONN_MAX_AGE seconds and health-checked before reuse.
+Setting DB_REPLICA_HOST (Postgres) or DB_REPLICA_NAME (SQLite) adds a 'replica'
+alias for fashion_style.db_routers.
+"""
+from pathlib import Path
+from decouple import config
+
+# Per-connection SQLite tuning. WAL lets readers run while a chat turn is being written,
+# NORMAL is durable in WAL mode, and mmap serves reads straight from the page cache.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def sqlite_init_command(pragmas=None):
+    """PRAGMA statements run on every new SQLite connection"""
+    return ' '.join(f"PRAGMA {name}={value};" for name, value in (pragmas or SQLITE_PRAGMAS).items())
+
+
+def sqlite_database(base_dir):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': config('DB_NAME', default=str(Path(base_dir) / 'db.sqlite3')),
+        'OPTIONS': {
+            'init_command': sqlite_init_command(),
+            # Take the write lock when a transaction starts. A deferred transaction that reads and then
+            # writes cannot wait for the lock and fails with "database is locked" straight away.
+            'transaction_mode': 'IMMEDIATE',
+            # Seconds a writer waits for the lock (SQLite's busy timeout) before giving up
+            'timeout': config('DB_BUSY_TIMEOUT', default=20, cast=int),
+        },
+    }
+
+
+def postgresql_database():
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': config('DB_NAME', default='stylish_fashion_db'),
+        'USER': config('DB_USER', default='stylish_user'),
+        'PASSWORD': config('DB_PASSWORD', default='stylish_pass'),
+        'HOST': config('DB_HOST', default='stylish-db'),
+        'PORT': config('DB_PORT', default='5432'),
+        'OPTIONS': {
+            'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+        },
+    }
+
+
+def database_config(base_dir):
+    """The 'default' DATABASES entry for the configured engine, with persistent connections"""
+    engine = config('DB_ENGINE', default='sqlite').lower()
+    if engine in ('postgres', 'postgresql'):
+        database = postgresql_database()
+    elif engine == 'sqlite':
+        database = sqlite_database(base_dir)
+    else:
+        raise ValueError(f"Unsupported DB_ENGINE {engine!r}; use 'sqlite' or 'postgresql'")
+
+    # Reuse a connection across requests instead of opening one per request, and
+    # check it is still alive before a new request uses it
+    database['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=60, cast=int)
+    database['CONN_HEALTH_CHECKS'] = config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool)
+    return database
+
+
+def replica_database_config(base_dir):
+    """
+    The 'replica' DATABASES entry: the default one pointed at DB_REPLICA_HOST / DB_REPLICA_NAME,
+    or None when no replica is configured
+    """
+    host = config('DB_REPLICA_HOST', default='')
+    name = config('DB_REPLICA_NAME', default='')
+    if not host and not name:
+        return None
+
+    replica = database_config(base_dir)
+    if host:
+        replica['HOST'] = host
+        replica['PORT'] = config('DB_REPLICA_PORT', default=replica.get('PORT', ''))
+    if name:
+        replica['NAME'] = name
+    replica['USER'] = config('DB_REPLICA_USER', default=replica.get('USER', ''))
+    replica['PASSWORD'] = config('DB_REPLICA_PASSWORD', default=replica.get('PASSWORD', ''))
+    # Tests have no replication; read the test default database instead
+    replica['TEST'] = {'MIRROR': 'default'}
+    return replica
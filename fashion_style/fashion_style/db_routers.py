@@ -0,0 +1,131 @@
+"""
+Read-replica routing.
+
+Reads go to the 'replica' database only inside replica_reads(), which views opt
+into with ReplicaReadMixin; everything else, and every write, uses 'default'.
+ReplicaStickinessMiddleware pins a user to the primary for
+DB_REPLICA_STICKY_SECONDS after a request of theirs wrote, so they read their
+own writes while the replica catches up.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+# Per-request {'wrote': bool}. Mutated in place rather than re-set, so a write made in a copy of the
+# request's context (asgiref's sync_to_async runs code in one) still reaches the middleware. Threads
+# from a ThreadPoolExecutor start with an empty context, so their writes do not pin the user.
+_request_state = ContextVar('replica_request_state', default=None)
+
+# Cache backends that keep entries inside one process: a pin set there is invisible to the other workers
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def replica_reads():
+    """Route the reads made inside the block to the replica, when one is configured"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def _pin_key(user_id):
+    return f"db_primary_pin:{user_id}"
+
+
+def pin_to_primary(user):
+    """Send the user's replica reads to the primary for DB_REPLICA_STICKY_SECONDS"""
+    cache.set(_pin_key(user.pk), True, getattr(settings, 'DB_REPLICA_STICKY_SECONDS', 5))
+
+
+def pin_after_write(user):
+    """
+    pin_to_primary for a write made outside the request/response cycle the middleware sees,
+    e.g. a turn saved when a streamed response finishes
+    """
+    if not replica_configured() or user is None or not user.is_authenticated:
+        return
+    try:
+        pin_to_primary(user)
+    except Exception as e:
+        logger.warning(f"Error pinning user to primary database: {e}")
+
+
+def check_primary_pin_cache(app_configs=None, **kwargs):
+    """System check: with a replica, the primary pins must live in a cache every worker shares"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if not replica_configured() or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [checks.Error(
+        f"A read replica is configured but the default cache ({backend}) is local to each process, so a "
+        "user pinned to the primary by one worker can read stale data from the replica through another.",
+        hint="Set REDIS_CACHE_URL, or add fashion_style.E001 to SILENCED_SYSTEM_CHECKS for a single-process development server.",
+        id='fashion_style.E001',
+    )]
+
+
+def is_pinned_to_primary(user):
+    return bool(user and user.is_authenticated and cache.get(_pin_key(user.pk)))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and replica_configured():
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['wrote'] = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+
+class ReplicaReadMixin:
+    """Serve a read-only view's GET from the replica unless the user has just written"""
+
+    def get(self, request, *args, **kwargs):
+        if is_pinned_to_primary(request.user):
+            return super().get(request, *args, **kwargs)
+        with replica_reads():
+            return super().get(request, *args, **kwargs)
+
+
+class ReplicaStickinessMiddleware:
+    """Pin the requesting user to the primary after a request that wrote to the database"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {'wrote': False}
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        # DRF copies the user it authenticated (e.g. from a JWT) onto the request
+        if state['wrote']:
+            pin_after_write(getattr(request, 'user', None))
+        return response
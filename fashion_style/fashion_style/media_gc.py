@@ -0,0 +1,213 @@
+"""
+Orphaned media collector.
+
+Rows do not always release their files: save_session_history prunes old turns
+with a fast delete (no post_delete signal), files uploaded before content
+addressing were never released, and release_media leaves files alone during its
+grace period. This walks the upload directories of MEDIA_ROOT in name order, a
+bounded slice per run resumed from a checkpoint, and deletes the files no row
+references. The checkpoint and the run lock live in MEDIA_ROOT/.media_gc/, next to
+the files they describe, so every process and host sharing the volume sees them.
+"""
+import json
+import os
+import time
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Q
+from .media_views import RENDITION_NAME, SOURCE_EXTENSIONS
+from .storage import CONTENT_DIR, MEDIA_REFERENCES, RENDITIONS_DIR
+
+STATE_DIR = '.media_gc'
+CHECKPOINT_FILE = 'checkpoint.json'
+LOCK_FILE = 'lock'
+
+
+def upload_directories():
+    """Top-level MEDIA_ROOT directories the app writes uploads to; nothing else is ever collected"""
+    directories = {CONTENT_DIR, RENDITIONS_DIR}
+    for model_label, field in MEDIA_REFERENCES:
+        upload_to = apps.get_model(model_label)._meta.get_field(field).upload_to
+        if isinstance(upload_to, str) and upload_to.strip('/'):
+            directories.add(upload_to.strip('/').split('/')[0])
+    return directories
+
+
+def state_path(root, name):
+    return os.path.join(root, STATE_DIR, name)
+
+
+def read_checkpoint(root):
+    try:
+        with open(state_path(root, CHECKPOINT_FILE)) as file:
+            return json.load(file).get('after', '')
+    except (FileNotFoundError, ValueError):
+        return ''
+
+
+def write_checkpoint(root, after):
+    # Write then rename, so a crash never leaves a half-written checkpoint
+    path = state_path(root, CHECKPOINT_FILE)
+    with open(f"{path}.tmp", 'w') as file:
+        json.dump({'after': after, 'updated': time.time()}, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def acquire_lock(root, timeout):
+    """Create the lock file, taking over one left behind by a run that died more than `timeout` seconds ago"""
+    os.makedirs(os.path.join(root, STATE_DIR), exist_ok=True)
+    path = state_path(root, LOCK_FILE)
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) < timeout:
+                    return False
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    return False
+
+
+def release_lock(root):
+    try:
+        os.remove(state_path(root, LOCK_FILE))
+    except FileNotFoundError:
+        pass
+
+
+def iter_media_names(root, after='', directories=None):
+    """
+    Relative names of every file under root in name order, starting after the given name;
+    only inside the given top-level directories when some are given
+    """
+    after_parts = tuple(after.split('/')) if after else ()
+
+    def walk(directory, parts):
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue  # .gitkeep, the collector's own state and the like are not uploads
+            if not parts and directories is not None and entry.name not in directories:
+                continue
+            entry_parts = parts + (entry.name,)
+            if entry.is_dir(follow_symlinks=False):
+                # Skip directories wholly before the checkpoint without listing them
+                if entry_parts >= after_parts[:len(entry_parts)]:
+                    yield from walk(entry.path, entry_parts)
+            elif entry.is_file(follow_symlinks=False) and entry_parts > after_parts:
+                yield '/'.join(entry_parts)
+
+    yield from walk(root, ())
+
+
+def referenced_names(names):
+    """The subset of names that a MEDIA_REFERENCES field or a recorded rendition points at"""
+    referenced = set()
+    for model_label, field in MEDIA_REFERENCES:
+        manager = apps.get_model(model_label)._default_manager
+        referenced.update(manager.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+
+    renditions = {name: RENDITION_NAME.match(name) for name in names if name not in referenced}
+    renditions = {name: match for name, match in renditions.items() if match}
+    if not renditions:
+        return referenced
+
+    # A rendition of a content-addressed file lives as long as any extension of its source does
+    by_key = {}
+    for name, match in renditions.items():
+        by_key.setdefault(match.group('key'), []).append(name)
+    sources = {f"{CONTENT_DIR}/{key[:2]}/{key}{ext}": key for key in by_key for ext in SOURCE_EXTENSIONS}
+    for model_label, field in MEDIA_REFERENCES:
+        manager = apps.get_model(model_label)._default_manager
+        for source in manager.filter(**{f'{field}__in': list(sources)}).values_list(field, flat=True):
+            referenced.update(by_key[sources[source]])
+
+    # Renditions of files stored before content addressing are only known from the recorded names
+    from ai_stylist_app.renditions import RENDITION_FIELDS
+    legacy = [name for name in renditions if name not in referenced]
+    for model_label, _, renditions_field in RENDITION_FIELDS:
+        if not legacy:
+            break
+        lookup = Q()
+        for name in legacy:
+            match = renditions[name]
+            lookup |= Q(**{f"{renditions_field}__{match.group('size')}__{match.group('fmt')}": name})
+        manager = apps.get_model(model_label)._default_manager
+        for recorded in manager.filter(lookup).values_list(renditions_field, flat=True):
+            recorded_names = {name for formats in recorded.values() if isinstance(formats, dict) for name in formats.values()}
+            referenced.update(recorded_names & set(legacy))
+        legacy = [name for name in legacy if name not in referenced]
+    return referenced
+
+
+def collect_orphaned_media(limit=None, batch_size=None, pause=None, grace=None, dry_run=False, restart=False):
+    """
+    Check up to `limit` files after the stored checkpoint, `batch_size` per reference query with
+    `pause` seconds between batches, and delete the unreferenced ones older than `grace` seconds.
+    A dry run reports the same without deleting or moving the checkpoint. Returns a report dict,
+    or None when another collection is running (MEDIA_GC_LOCK_TIMEOUT bounds a dead run's lock).
+    """
+    limit = limit or getattr(settings, 'MEDIA_GC_FILES_PER_RUN', 20000)
+    batch_size = batch_size or getattr(settings, 'MEDIA_GC_BATCH_SIZE', 500)
+    pause = getattr(settings, 'MEDIA_GC_BATCH_PAUSE', 0.2) if pause is None else pause
+    grace = getattr(settings, 'MEDIA_GC_GRACE_SECONDS', 24 * 60 * 60) if grace is None else grace
+    # Never collect a file release_media would still keep
+    grace = max(grace, getattr(settings, 'MEDIA_RELEASE_GRACE_SECONDS', 300))
+
+    root = settings.MEDIA_ROOT
+    if not acquire_lock(root, getattr(settings, 'MEDIA_GC_LOCK_TIMEOUT', 60 * 60)):
+        return None
+
+    try:
+        start = '' if restart else read_checkpoint(root)
+        report = {
+            'start': start, 'checkpoint': start, 'scanned': 0, 'orphaned': 0,
+            'deleted': 0, 'bytes_reclaimed': 0, 'complete': False, 'dry_run': dry_run,
+        }
+
+        names = iter_media_names(root, start, upload_directories())
+        while report['scanned'] < limit:
+            batch = []
+            for name in names:
+                batch.append(name)
+                if len(batch) >= min(batch_size, limit - report['scanned']):
+                    break
+            if not batch:
+                report['complete'] = True
+                break
+
+            referenced = referenced_names(batch)
+            for name in batch:
+                if name in referenced:
+                    continue
+                path = os.path.join(root, *name.split('/'))
+                try:
+                    stat = os.stat(path)
+                    # Re-read right before deleting: ContentAddressedStorage touches files it re-references
+                    if time.time() - stat.st_mtime < grace:
+                        continue
+                    report['orphaned'] += 1
+                    if not dry_run:
+                        os.remove(path)
+                        report['deleted'] += 1
+                    report['bytes_reclaimed'] += stat.st_size
+                except FileNotFoundError:
+                    continue
+
+            report['scanned'] += len(batch)
+            report['checkpoint'] = batch[-1]
+            if pause:
+                time.sleep(pause)
+
+        if not dry_run:
+            # A finished pass starts over from the beginning next time
+            write_checkpoint(root, '' if report['complete'] else report['checkpoint'])
+        return report
+    finally:
+        release_lock(root)
@@ -0,0 +1,178 @@
+"""
+Protected media delivery.
+
+Django only decides whether the requester may see a file; with
+MEDIA_ACCEL_REDIRECT_PREFIX set, the bytes are sent by the front proxy through an
+X-Accel-Redirect to an internal location. Without it (development) the file is
+served here, Range and If-Range requests included.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import AllowAny
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+from .storage import CONTENT_DIR, MEDIA_REFERENCES, RENDITIONS_DIR
+
+ADMIN_ROLES = ['Stap_admin', 'superadmin']
+# Field holding each referencing row's owner; rows without one are anonymous uploads
+OWNER_FIELDS = {
+    'ai_stylist_app.SessionHistory': 'user_id',
+    'ai_stylist_app.OutfitAnalysis': 'user',
+    'ai_stylist_app.AnalysisJob': 'user',
+    'fashion_app.User': 'pk',
+}
+SOURCE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.webp', '.gif', '']
+RENDITION_NAME = re.compile(
+    rf'^{RENDITIONS_DIR}/[0-9a-f]{{2}}/(?P<key>[0-9a-f]{{64}})_(?P<size>[a-z0-9]+)\.(?P<fmt>[a-z]+)$'
+)
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+MUTABLE_CACHE_CONTROL = 'private, max-age=3600'
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def is_hashed_name(name):
+    """Content-addressed files and their renditions never change under the same name"""
+    return name.startswith(f"{CONTENT_DIR}/") or name.startswith(f"{RENDITIONS_DIR}/")
+
+
+def owner_filter(model_label, user):
+    """Rows of a referencing model the user may see media of, or None for none of them"""
+    field = OWNER_FIELDS[model_label]
+    if field == 'pk':
+        return Q(pk=user.pk) if user.is_authenticated else None
+    if field == 'user_id':
+        # SessionHistory.user_id is a CharField
+        anonymous = Q(user_id__isnull=True) | Q(user_id='')
+        owned = Q(user_id=str(user.pk))
+    else:
+        anonymous = Q(**{f'{field}__isnull': True})
+        owned = Q(**{field: user.pk})
+    return anonymous | owned if user.is_authenticated else anonymous
+
+
+def referenced_for(user, references):
+    """Whether any (model label, Q) reference is a row the user may see"""
+    for model_label, lookup in references:
+        allowed = owner_filter(model_label, user)
+        if allowed is not None and apps.get_model(model_label)._default_manager.filter(lookup, allowed).exists():
+            return True
+    return False
+
+
+def can_access_media(user, name):
+    """Admins see every file; others the files of their own rows and of anonymous uploads"""
+    if user.is_authenticated and (user.is_staff or getattr(user, 'role', None) in ADMIN_ROLES):
+        return True
+
+    match = RENDITION_NAME.match(name)
+    if not match:
+        return referenced_for(user, [(label, Q(**{field: name})) for label, field in MEDIA_REFERENCES])
+
+    # A rendition of a content-addressed file is keyed by that file's hash
+    key = match.group('key')
+    sources = [f"{CONTENT_DIR}/{key[:2]}/{key}{ext}" for ext in SOURCE_EXTENSIONS]
+    if referenced_for(user, [(label, Q(**{f'{field}__in': sources})) for label, field in MEDIA_REFERENCES]):
+        return True
+
+    # Renditions of files stored before content addressing are only known from the recorded names
+    from ai_stylist_app.renditions import RENDITION_FIELDS
+    lookup = f"{match.group('size')}__{match.group('fmt')}"
+    return referenced_for(user, [
+        (label, Q(**{f'{renditions_field}__{lookup}': name})) for label, _, renditions_field in RENDITION_FIELDS
+    ])
+
+
+def media_etag(name, stat):
+    if is_hashed_name(name):
+        return f'"{os.path.splitext(os.path.basename(name))[0]}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+class ProtectedMediaView(APIView):
+    """
+    Ownership-checked media
+    GET /media/<path>
+    """
+    permission_classes = [AllowAny]
+    # Session auth too, so the Django admin can show images
+    authentication_classes = [*api_settings.DEFAULT_AUTHENTICATION_CLASSES, SessionAuthentication]
+
+    def get(self, request, name):
+        try:
+            path = safe_join(settings.MEDIA_ROOT, name)
+        except SuspiciousFileOperation:
+            raise Http404
+        name = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+        # Unknown and forbidden files look the same
+        if not can_access_media(request.user, name):
+            raise Http404
+        if not os.path.isfile(path):
+            raise Http404
+        stat = os.stat(path)
+
+        etag = media_etag(name, stat)
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and (etag in parse_etags(if_none_match) or '*' in parse_etags(if_none_match)):
+            response = HttpResponseNotModified()
+        else:
+            response = self.deliver(request, name, path, stat)
+
+        response['ETag'] = etag
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if is_hashed_name(name) else MUTABLE_CACHE_CONTROL
+        response['Accept-Ranges'] = 'bytes'
+        patch_vary_headers(response, ['Authorization', 'Cookie'])
+        return response
+
+    def deliver(self, request, name, path, stat):
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '')
+        if prefix:
+            # The proxy sends the file (and answers Range requests) from its internal location
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(name)
+            return response
+
+        byte_range = self.requested_range(request, stat.st_size, media_etag(name, stat))
+        if byte_range is None:
+            return FileResponse(open(path, 'rb'), content_type=content_type)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{stat.st_size}"
+            return response
+
+        start, end = byte_range
+        with open(path, 'rb') as file:
+            file.seek(start)
+            response = HttpResponse(file.read(end - start + 1), content_type=content_type, status=206)
+        response['Content-Range'] = f"bytes {start}-{end}/{stat.st_size}"
+        return response
+
+    def requested_range(self, request, size, etag):
+        """(start, end) of a single satisfiable byte range, None to send the whole file, False if unsatisfiable"""
+        match = RANGE_HEADER.match(request.META.get('HTTP_RANGE', '').strip())
+        if not match or not any(match.groups()):
+            return None  # no Range header, or several ranges: send the whole file
+        if_range = request.META.get('HTTP_IF_RANGE', '').strip()
+        if if_range and if_range != etag:
+            # The client's copy is stale (or named by a date; no Last-Modified is sent): the whole file it is
+            return None
+        first, last = match.groups()
+        if not first:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        if size == 0 or start > end or start >= size:
+            return False
+        return start, end
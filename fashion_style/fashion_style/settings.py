@@ -13,6 +13,8 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv # AI
 from decouple import config
+from celery.schedules import crontab
+from .database import database_config, replica_database_config
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
@@ -62,6 +64,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'fashion_style.db_routers.ReplicaStickinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -89,13 +92,18 @@ WSGI_APPLICATION = 'fashion_style.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite by default; set DB_ENGINE=postgresql and the DB_* credentials for Postgres (see fashion_style/database.py)
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
 }
 
+# Optional read replica for the history and listing endpoints (see fashion_style/db_routers.py)
+_replica = replica_database_config(BASE_DIR)
+if _replica:
+    DATABASES['replica'] = _replica
+DATABASE_ROUTERS = ['fashion_style.db_routers.ReplicaRouter']
+DB_REPLICA_STICKY_SECONDS = config('DB_REPLICA_STICKY_SECONDS', default=5, cast=int)  # primary reads after a write
+
 
 # DATABASES = {
 #     'default': {
@@ -188,6 +196,31 @@ CORS_ALLOW_CREDENTIALS = True
 # Media Files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Uploads are stored once per distinct content under media/content/ (see fashion_style/storage.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'fashion_style.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+MEDIA_RELEASE_GRACE_SECONDS = 300  # files re-referenced this recently are never released
+# Media is served by fashion_style.media_views after an ownership check. Outside DEBUG the file itself is
+# sent by nginx from an internal location at this prefix (X-Accel-Redirect); empty serves it from Django.
+MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='' if DEBUG else '/protected-media/')
+# Thumbnails written by a Celery task after an outfit, history or profile image is saved (WebP and JPEG each)
+MEDIA_RENDITION_SIZES = {'small': 200, 'medium': 480, 'large': 960}  # longest edge in px
+MEDIA_RENDITIONS_QUEUE_TIMEOUT = 600  # one queued rendition task per file at a time
+MEDIA_RENDITIONS_RETRY_BACKOFF = 60  # seconds before a file retries queueing after the broker refused
+# Orphaned media collector (collect_orphaned_media command / beat task): files checked per run, per
+# reference query and the pause between queries; files modified within the grace period are kept.
+# Only the upload directories are scanned; the checkpoint and lock live in MEDIA_ROOT/.media_gc/
+MEDIA_GC_FILES_PER_RUN = config('MEDIA_GC_FILES_PER_RUN', default=20000, cast=int)
+MEDIA_GC_BATCH_SIZE = 500
+MEDIA_GC_BATCH_PAUSE = 0.2  # seconds
+MEDIA_GC_GRACE_SECONDS = config('MEDIA_GC_GRACE_SECONDS', default=60 * 60 * 24, cast=int)
+MEDIA_GC_LOCK_TIMEOUT = 60 * 60  # a run's lock file older than this is taken over as left by a dead run
 
 # Email Configuration 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -214,4 +247,113 @@ CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'  # Redis
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
-CELERY_TIMEZONE = TIME_ZONE
\ No newline at end of file
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_PUBLISH_CONNECT_TIMEOUT = 1  # seconds a request waits for the broker in fashion_style.celery.publish
+CELERY_BEAT_SCHEDULE = {
+    # Run with: celery -A fashion_style beat
+    'reconcile-user-counters': {
+        'task': 'fashion_app.tasks.reconcile_user_counters_task',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'rollup-daily-user-stats': {
+        'task': 'fashion_app.tasks.rollup_daily_user_stats_task',
+        'schedule': crontab(hour=0, minute=5),
+    },
+    'collect-orphaned-media': {
+        'task': 'ai_stylist_app.tasks.collect_orphaned_media_task',
+        'schedule': crontab(minute=15),  # hourly, MEDIA_GC_FILES_PER_RUN files at a time
+    },
+}
+
+# Cache configuration (AI)
+# Local memory by default (and in tests); set REDIS_CACHE_URL to share caches across workers in production.
+# Redis evicts by its own maxmemory-policy, so run it with allkeys-lru for LRU behaviour.
+REDIS_CACHE_URL = config('REDIS_CACHE_URL', default='')
+AI_ANALYSIS_CACHE_ENABLED = config('AI_ANALYSIS_CACHE_ENABLED', default=True, cast=bool)
+AI_ANALYSIS_CACHE_TTL = config('AI_ANALYSIS_CACHE_TTL', default=60 * 60 * 24 * 7, cast=int)  # 7 days
+AI_ANALYSIS_CACHE_MAX_ENTRIES = config('AI_ANALYSIS_CACHE_MAX_ENTRIES', default=1000, cast=int)
+
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'KEY_PREFIX': 'fashion_style',
+        },
+        'ai_analysis': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'KEY_PREFIX': 'fashion_style_ai',
+            'TIMEOUT': AI_ANALYSIS_CACHE_TTL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'fashion_style-default',
+        },
+        'ai_analysis': {
+            # LocMemCache evicts least-recently-used entries once MAX_ENTRIES is reached
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'fashion_style-ai-analysis',
+            'TIMEOUT': AI_ANALYSIS_CACHE_TTL,
+            'OPTIONS': {'MAX_ENTRIES': AI_ANALYSIS_CACHE_MAX_ENTRIES},
+        },
+    }
+
+AI_METRICS_CACHE_ALIAS = 'default'
+
+# Image preprocessing for AI vision calls
+AI_IMAGE_MAX_EDGE = config('AI_IMAGE_MAX_EDGE', default=1024, cast=int)  # longest side sent to the model, in px
+AI_IMAGE_JPEG_QUALITY = config('AI_IMAGE_JPEG_QUALITY', default=85, cast=int)
+AI_IMAGE_DETAIL = config('AI_IMAGE_DETAIL', default='auto')  # 'low' caps image input at a fixed 85 tokens
+
+# Batch outfit analysis
+AI_BATCH_MAX_IMAGES = config('AI_BATCH_MAX_IMAGES', default=10, cast=int)
+AI_BATCH_MAX_WORKERS = config('AI_BATCH_MAX_WORKERS', default=4, cast=int)  # concurrent vision calls per batch
+
+# Chat turns with both an image and a query get the analysis and the answer from one model call
+AI_COMBINED_IMAGE_QUERY = config('AI_COMBINED_IMAGE_QUERY', default=True, cast=bool)
+
+# Hold outfit analyses to a JSON schema via the model's structured-output mode
+AI_STRUCTURED_OUTPUT = config('AI_STRUCTURED_OUTPUT', default=True, cast=bool)
+
+# Conversation history sent with each AI request, newest turns first until the endpoint's budget is spent
+AI_HISTORY_MAX_TURNS = config('AI_HISTORY_MAX_TURNS', default=10, cast=int)
+AI_HISTORY_TOKEN_BUDGETS = {
+    'analysis': config('AI_HISTORY_TOKENS_ANALYSIS', default=400, cast=int),
+    'combined': config('AI_HISTORY_TOKENS_COMBINED', default=800, cast=int),
+    'text_query': config('AI_HISTORY_TOKENS_TEXT_QUERY', default=1200, cast=int),
+}
+# tiktoken's BPE file is read from here and never downloaded while serving; `python manage.py
+# fetch_tokenizer` fills it at build time. Without it token counts are estimated from length.
+AI_TOKENIZER_CACHE_DIR = config('TIKTOKEN_CACHE_DIR', default=str(BASE_DIR / 'tiktoken_cache'))
+
+# Rolling session summaries: every AI_SUMMARY_EVERY_TURNS turns a background task folds all but the
+# latest AI_SUMMARY_KEEP_RECENT_TURNS into a running summary written by the cheaper summary model
+AI_SESSION_SUMMARIES_ENABLED = config('AI_SESSION_SUMMARIES_ENABLED', default=True, cast=bool)
+AI_SUMMARY_MODEL = config('AI_SUMMARY_MODEL', default='gpt-4o-mini')
+AI_SUMMARY_EVERY_TURNS = config('AI_SUMMARY_EVERY_TURNS', default=4, cast=int)
+AI_SUMMARY_KEEP_RECENT_TURNS = config('AI_SUMMARY_KEEP_RECENT_TURNS', default=4, cast=int)
+AI_SUMMARY_MAX_TOKENS = config('AI_SUMMARY_MAX_TOKENS', default=250, cast=int)
+AI_SUMMARY_MAX_TURN_TOKENS = 400  # each turn is cut to this before summarizing
+AI_SUMMARY_RETRY_BACKOFF = 60  # seconds before a session retries queueing a summary the broker refused
+
+# Turns kept per session in SessionHistory; older ones are pruned on every save
+AI_SESSION_HISTORY_LIMIT = config('AI_SESSION_HISTORY_LIMIT', default=10, cast=int)
+
+# Cached per-session context (latest turns + summary), written through on every saved turn.
+# Without Redis each worker process has its own copy, so keep it short-lived to bound staleness.
+AI_SESSION_CONTEXT_CACHE_ALIAS = 'default'
+AI_SESSION_CONTEXT_TTL = config('AI_SESSION_CONTEXT_TTL', default=3600 if REDIS_CACHE_URL else 30, cast=int)
+AI_SESSION_CONTEXT_LOCK_TIMEOUT = 5  # seconds; concurrent writers of one session drop the cached copy instead of merging
+
+# Admin dashboard counts are cached this long (seconds); finished days are read from DailyUserStats
+DASHBOARD_CACHE_TTL = config('DASHBOARD_CACHE_TTL', default=60, cast=int)
+
+# Uploads to the AI endpoints are checked while they stream (ai_stylist_app/upload_handlers.py):
+# JPEG/PNG magic bytes in the first chunk, AI_UPLOAD_MAX_IMAGE_SIZE per image and the Content-Length up front
+AI_UPLOAD_MAX_IMAGE_SIZE = 5 * 1024 * 1024
+# Files larger than this are spooled to a temporary file instead of being held in memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = config('FILE_UPLOAD_MAX_MEMORY_SIZE', default=1024 * 1024, cast=int)
@@ -0,0 +1,123 @@
+"""
+Content-addressed media storage.
+
+Uploads are stored once under content/<2-char prefix>/<sha256><ext>, whatever
+upload_to directory the field asks for, so the same image saved for an outfit
+analysis, a session history turn or a re-upload in another session is written
+and kept a single time. A file is deleted only when no row references it any more.
+"""
+import hashlib
+import os
+import time
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONTENT_DIR = 'content'
+RENDITIONS_DIR = 'renditions'  # thumbnails, already named after their source's content (ai_stylist_app.renditions)
+HASH_CHUNK_SIZE = 64 * 1024
+
+# (model, field) pairs that can point at a stored file
+MEDIA_REFERENCES = [
+    ('ai_stylist_app.SessionHistory', 'image'),
+    ('ai_stylist_app.OutfitAnalysis', 'image'),
+    ('ai_stylist_app.AnalysisJob', 'image'),
+    ('fashion_app.User', 'profile_image'),
+]
+
+
+def content_hash(content):
+    """sha256 hex digest of a file's bytes, leaving it positioned at the start"""
+    digest = hashlib.sha256()
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def is_content_name(name):
+    return bool(name) and name.startswith(f"{CONTENT_DIR}/")
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by the hash of their bytes and skips writing known content"""
+
+    def __init__(self, **kwargs):
+        # Two concurrent saves of new content pick the same name and write the same bytes
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def hashed_name(self, name, content):
+        digest = content_hash(content)
+        ext = os.path.splitext(name or '')[1].lower()
+        return f"{CONTENT_DIR}/{digest[:2]}/{digest}{ext}"
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        if name.startswith(f"{RENDITIONS_DIR}/"):
+            return super().save(name, content, max_length=max_length)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Refresh mtime so a release() racing with this new reference leaves the file alone
+            try:
+                os.utime(self.path(name))
+            except OSError:
+                pass
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+def media_references(name):
+    """Number of rows across MEDIA_REFERENCES that point at a stored file"""
+    total = 0
+    for model_label, field in MEDIA_REFERENCES:
+        model = apps.get_model(model_label)
+        total += model._default_manager.filter(**{field: name}).count()
+    return total
+
+
+def release_media(name, storage=None):
+    """
+    Delete a content-addressed file once nothing references it. Files touched within
+    MEDIA_RELEASE_GRACE_SECONDS are kept (a new reference may be on its way); the
+    orphaned media collector removes them later.
+    """
+    storage = storage or default_storage
+    if not is_content_name(name) or not isinstance(storage, ContentAddressedStorage):
+        return False
+
+    try:
+        if media_references(name):
+            return False
+        grace = getattr(settings, 'MEDIA_RELEASE_GRACE_SECONDS', 300)
+        if time.time() - os.path.getmtime(storage.path(name)) < grace:
+            return False
+        storage.delete(name)
+        from ai_stylist_app.renditions import delete_renditions
+        delete_renditions(name, storage)
+        return True
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        logger.error(f"Error releasing media file {name}: {e}")
+        return False
+
+
+def release_media_on_delete(sender, instance, **kwargs):
+    """post_delete receiver: release the files a deleted row referenced once its transaction commits"""
+    for model_label, field in MEDIA_REFERENCES:
+        if sender._meta.label != model_label:
+            continue
+        file = getattr(instance, field)
+        if file and file.name:
+            name, storage = file.name, file.storage
+            transaction.on_commit(lambda: release_media(name, storage))
@@ -17,9 +17,9 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings # AI
-from django.conf.urls.static import static # AI
 from rest_framework import routers
 from ai_stylist_app.routers import ai_stylist_router # AI
+from .media_views import ProtectedMediaView
 
 api_routers = routers.DefaultRouter()
 api_routers.registry.extend(ai_stylist_router.registry)
@@ -31,6 +31,6 @@ urlpatterns = [
     path('api/', include('fashion_app.urls')),
     path('api/prompt/', include(api_routers.urls)),  # AI
     path('api/ai/', include('ai_stylist_app.urls')), # AI
+    # Ownership-checked media; the bytes go out through the proxy's X-Accel-Redirect outside DEBUG
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:name>", ProtectedMediaView.as_view(), name='protected_media'),
 ] 
-if settings.DEBUG:
- urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)